@@ -1,35 +1,130 @@
-import sqlite3
+import argparse
+import hashlib
+import itertools
 import os
+import re
+import sqlite3
+from modules.document_search import ensure_documents_fts
 
 # Define the path for the new database
 DB_PATH = os.path.join("modules", "hts_data.db")
+# Text corpus seeded alongside the built-in rows when it exists
+CORPUS_PATH = os.path.join("modules", "your_documents.txt")
+# Passages longer than this are split at sentence boundaries
+CHUNK_CHARS = 1000
+# Passages hashed and inserted per executemany call, so large corpora are streamed
+INSERT_BATCH_SIZE = 10_000
+
+SEED_DOCUMENTS = [
+    "The United States-Israel Free Trade Agreement (FTA) is the first free trade agreement entered into by the United States.",
+    "Signed in 1985, it aims to eliminate trade barriers and promote economic cooperation between the United States and Israel.",
+    "Under the agreement, tariffs on industrial and agricultural goods between the two nations are reduced or eliminated.",
+    "The FTA has provisions to resolve trade disputes and protect intellectual property rights.",
+    "The agreement has significantly increased trade volume, benefiting industries like technology, agriculture, and pharmaceuticals.",
+]
+
+
+def content_hash(content):
+    """SHA-256 of a passage with its whitespace collapsed, so re-wrapped copies count as duplicates."""
+    return hashlib.sha256(" ".join(content.split()).encode("utf-8")).hexdigest()
+
+
+def chunk_text(text, max_chars=CHUNK_CHARS):
+    """Split text into passages: one per blank-line-separated paragraph, long ones cut between sentences."""
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = " ".join(paragraph.split())
+        chunk = ""
+        for sentence in re.split(r"(?<=[.!?])\s+", paragraph):
+            if chunk and len(chunk) + 1 + len(sentence) > max_chars:
+                yield chunk
+                chunk = ""
+            chunk = f"{chunk} {sentence}" if chunk else sentence
+        if chunk:
+            yield chunk
+
 
-def initialize_database():
-    # Create a connection to the database
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+def corpus_files(paths):
+    """Expand files and directories (searched recursively for *.txt) into a sorted list of files."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in names if name.endswith(".txt"))
+        else:
+            files.append(path)
+    return sorted(files)
 
-    # Create the `documents` table
-    cursor.execute("""
+
+def corpus_passages(paths):
+    """Yield the chunked passages of every corpus file, reading one file at a time."""
+    for file_name in corpus_files(paths):
+        with open(file_name, encoding="utf-8") as file:
+            yield from chunk_text(file.read())
+
+
+def ensure_documents_table(conn):
+    """Create `documents` with a unique content_hash index, migrating tables from before the hash.
+
+    An existing table gets the column backfilled and its duplicate rows dropped
+    (the oldest copy is kept) before the unique index is created.
+    """
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS documents (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
-            content TEXT NOT NULL
+            content TEXT NOT NULL,
+            content_hash TEXT
         )
     """)
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(documents)")]
+    if "content_hash" not in columns:
+        conn.execute("ALTER TABLE documents ADD COLUMN content_hash TEXT")
+    conn.create_function("content_hash", 1, content_hash, deterministic=True)
+    conn.execute("UPDATE documents SET content_hash = content_hash(content) WHERE content_hash IS NULL")
+    conn.execute("DELETE FROM documents WHERE id NOT IN (SELECT min(id) FROM documents GROUP BY content_hash)")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_documents_content_hash ON documents (content_hash)")
+
+
+def initialize_database(corpus_paths=None, db_path=DB_PATH):
+    """Seed `documents` with the built-in rows and the chunked passages of corpus_paths.
+
+    corpus_paths are text files or directories of them; by default CORPUS_PATH is
+    used when it exists. Passages already present (same content_hash) are skipped,
+    so running this again adds nothing. Everything is loaded in one transaction.
+    """
+    if corpus_paths is None:
+        corpus_paths = [CORPUS_PATH] if os.path.exists(CORPUS_PATH) else []
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            ensure_documents_table(conn)
+            passages = itertools.chain(SEED_DOCUMENTS, corpus_passages(corpus_paths))
+            total = inserted = 0
+            while batch := list(itertools.islice(passages, INSERT_BATCH_SIZE)):
+                cursor = conn.executemany(
+                    "INSERT INTO documents (content, content_hash) VALUES (?, ?) ON CONFLICT (content_hash) DO NOTHING",
+                    [(passage, content_hash(passage)) for passage in batch],
+                )
+                total += len(batch)
+                inserted += cursor.rowcount
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
 
-    # Populate the `documents` table with example data
-    data = [
-        ("The United States-Israel Free Trade Agreement (FTA) is the first free trade agreement entered into by the United States."),
-        ("Signed in 1985, it aims to eliminate trade barriers and promote economic cooperation between the United States and Israel."),
-        ("Under the agreement, tariffs on industrial and agricultural goods between the two nations are reduced or eliminated."),
-        ("The FTA has provisions to resolve trade disputes and protect intellectual property rights."),
-        ("The agreement has significantly increased trade volume, benefiting industries like technology, agriculture, and pharmaceuticals.")
-    ]
+        # Full-text index used by the RAG fallback; triggers keep it in sync from here on
+        ensure_documents_fts(conn)
+    finally:
+        conn.close()
+    print(f"Database initialized successfully: {inserted} passages added, {total - inserted} already present.")
+    return inserted
 
-    cursor.executemany("INSERT INTO documents (content) VALUES (?)", [(d,) for d in data])
-    conn.commit()
-    conn.close()
-    print("Database initialized successfully.")
 
 if __name__ == "__main__":
-    initialize_database()
+    parser = argparse.ArgumentParser(description="Seed the documents table used by the RAG tool.")
+    parser.add_argument("corpus", nargs="*", help=f"Text files or directories of .txt files (default: {CORPUS_PATH}).")
+    parser.add_argument("--db", default=DB_PATH, help="SQLite database to seed.")
+    args = parser.parse_args()
+    initialize_database(args.corpus or None, args.db)
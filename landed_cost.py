@@ -0,0 +1,56 @@
+import argparse
+import sys
+import time
+
+import pandas as pd
+
+from modules.hts_duty_calculator import calculate_duties
+
+DEFAULT_CHUNK_SIZE = 100_000
+
+
+def stream_landed_costs(input_path, output_path, chunk_size=DEFAULT_CHUNK_SIZE, log=sys.stderr):
+    """Price a shipment CSV chunk by chunk, appending each priced chunk to output_path.
+
+    Only one chunk is held in memory at a time, so input size is unbounded.
+    Use "-" as output_path to write to stdout. Returns the number of rows written.
+    """
+    start = time.perf_counter()
+    rows = 0
+    output = sys.stdout if output_path == "-" else open(output_path, "w", newline="")
+    try:
+        with pd.read_csv(input_path, chunksize=chunk_size, dtype={"HTS Code": str}) as reader:
+            for chunk_number, chunk in enumerate(reader):
+                result = calculate_duties(chunk)
+                result.to_csv(output, header=chunk_number == 0, index=False)
+                output.flush()
+
+                rows += len(result)
+                elapsed = time.perf_counter() - start
+                print(f"{rows:,} rows in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/sec)", file=log)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compute duty and total landed cost for every line of a shipment CSV "
+                    "with columns: HTS Code, Product Cost, Freight, Insurance "
+                    "and optionally Quantity (in the unit of the line's specific rate)."
+    )
+    parser.add_argument("input", help="Shipment CSV to price.")
+    parser.add_argument("output", help="Where to write the priced CSV ('-' for stdout).")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"Rows per chunk (default {DEFAULT_CHUNK_SIZE:,}).")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    rows = stream_landed_costs(args.input, args.output, args.chunk_size)
+    elapsed = time.perf_counter() - start
+    print(f"Priced {rows:,} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):,.0f} rows/sec).", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,9 +3,13 @@ import pandas as pd
 import streamlit as st
 from modules.rag_tool import initialize_rag_tool, handle_rag_query, save_to_memory as save_rag_memory, \
     load_from_memory as load_rag_memory
-from modules.hts_duty_calculator import handle_duty_calculation, save_to_memory, load_from_memory
+from modules.hts_duty_calculator import handle_duty_calculation, rate_unit, save_to_memory, load_from_memory
+from modules.prepare_db import complete_hts_code, origin_countries, special_programs
+from modules.origin_rules import COUNTRY_NAMES
+from modules.description_search import search_hts_by_description
 import io
 import json
+from datetime import datetime
 
 # Suppress TensorFlow warnings
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
@@ -106,13 +110,48 @@ def main():
         duty_memory = st.session_state.duty_memory
 
         # Input fields for duty calculation
-        hts_code = st.text_input("Enter HTS Code:")
+        # Search-as-you-type: only codes from the schedule can be selected
+        hts_prefix = st.text_input("Enter HTS Code:", help="Type the first digits; dots are optional.")
+        product_query = st.text_input("...or find HTS Code by product description:",
+                                      help="e.g. feather meal, ivory powder", disabled=bool(hts_prefix))
+        if hts_prefix:
+            completions = dict(complete_hts_code(hts_prefix))
+            if not completions:
+                st.warning(f"No HTS code starts with '{hts_prefix}'.")
+        elif product_query:
+            completions = {code: description for code, description, _ in search_hts_by_description(product_query)}
+            if not completions:
+                st.warning(f"No HTS description matches '{product_query}'.")
+        else:
+            completions = {}
+        hts_code = st.selectbox(
+            "Matching HTS Codes:",
+            list(completions),
+            format_func=lambda code: f"{code} — {completions[code][:100]}",
+        )
         product_cost = st.number_input("Enter Product Cost ($):", min_value=0.0)
         freight = st.number_input("Enter Freight Cost ($):", min_value=0.0)
         insurance = st.number_input("Enter Insurance Cost ($):", min_value=0.0)
 
-        if st.button("Calculate"):
-            result = handle_duty_calculation(hts_code, product_cost, freight, insurance)
+        # Origin picks the rate column: FTA partners get Special rates, Column 2 countries Column 2 rates
+        origin = st.selectbox(
+            "Country of Origin:",
+            ["Other"] + origin_countries(),
+            format_func=lambda code: code if code == "Other" else f"{code} — {COUNTRY_NAMES.get(code, code)}",
+        )
+        origin = None if origin == "Other" else origin
+        # Programs not implied by the origin (e.g. GSP "A", AGOA "D") are claimed explicitly
+        program = st.selectbox("Special Program (optional):", ["None"] + special_programs())
+        program = None if program == "None" else program
+
+        # Specific and compound rates (e.g. "0.8¢/kg") are charged per unit of the rate that applies
+        unit = rate_unit(hts_code, program, origin) if hts_code else ""
+        quantity = st.number_input(f"Enter Quantity ({unit or 'in the rate unit'}):", min_value=0.0,
+                                   key="duty_quantity")
+
+        if st.button("Calculate", disabled=hts_code is None):
+            result = handle_duty_calculation(hts_code, product_cost, freight, insurance, quantity,
+                                             program=program, origin=origin)
 
             # Update memory with inputs and results
             duty_memory.append({
@@ -120,8 +159,12 @@ def main():
                 "Product Cost": product_cost,
                 "Freight": freight,
                 "Insurance": insurance,
+                "Quantity": quantity,
+                "Program": program,
+                "Country of Origin": origin,
                 "Duty Cost": result["Duty Cost"],
                 "Total Landed Cost": result["Total Landed Cost"],
+                "Timestamp": datetime.now().isoformat(timespec="seconds"),
             })
             save_to_memory(duty_memory, duty_memory_file)
             st.session_state.duty_memory = duty_memory
@@ -0,0 +1,95 @@
+import glob
+
+import duckdb
+
+from modules.prepare_db import TARIFF_CSV_PATH
+
+# Duty Calculator history written by main.py, one file per user ID.
+DUTY_MEMORY_GLOB = "*_duty_memory.json"
+
+# Keys of a duty memory entry; entries saved before a key existed read it as NULL.
+DUTY_MEMORY_COLUMNS = {
+    "HTS Code": "VARCHAR",
+    "Product Cost": "DOUBLE",
+    "Freight": "DOUBLE",
+    "Insurance": "DOUBLE",
+    "Quantity": "DOUBLE",
+    "Country of Origin": "VARCHAR",
+    "Duty Cost": "DOUBLE",
+    "Total Landed Cost": "DOUBLE",
+    "Timestamp": "VARCHAR",
+}
+
+
+def _literal(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def connect_analytics(tariff_csv=TARIFF_CSV_PATH, memory_glob=DUTY_MEMORY_GLOB):
+    """Open an in-memory DuckDB database with `tariffs` and `duty_history` views.
+
+    Both views scan their files when queried, so results always reflect the
+    current schedule and history. duty_history adds user_id (from the file name),
+    chapter (first two digits of the HTS code) and month (from Timestamp).
+    """
+    conn = duckdb.connect()
+    conn.execute(f"""
+        CREATE VIEW tariffs AS
+        SELECT * FROM read_csv({_literal(tariff_csv)}, header = true, all_varchar = true)
+    """)
+    columns = ", ".join(f"{_literal(name)}: {_literal(dtype)}" for name, dtype in DUTY_MEMORY_COLUMNS.items())
+    if glob.glob(memory_glob):
+        source = (f"read_json({_literal(memory_glob)}, format = 'array', columns = {{{columns}}}, "
+                  f"filename = true)")
+    else:
+        # read_json fails on a glob with no matches; expose an empty history instead.
+        casts = ", ".join(f'CAST(NULL AS {dtype}) AS "{name}"' for name, dtype in DUTY_MEMORY_COLUMNS.items())
+        source = f"(SELECT {casts}, CAST(NULL AS VARCHAR) AS filename WHERE false)"
+    conn.execute(f"""
+        CREATE VIEW duty_history AS
+        SELECT *,
+               regexp_extract(filename, '(\\d+)_duty_memory\\.json$', 1) AS user_id,
+               left(regexp_replace("HTS Code", '\\D', '', 'g'), 2) AS chapter,
+               date_trunc('month', try_cast("Timestamp" AS TIMESTAMP)) AS month
+        FROM {source}
+    """)
+    return conn
+
+
+def top_codes_by_duty(limit=10, conn=None):
+    """HTS codes ranked by total duty paid, with their schedule description."""
+    conn = conn or connect_analytics()
+    return conn.execute("""
+        SELECT h."HTS Code", any_value(t."Description") AS "Description",
+               count(*) AS "Entries", sum(h."Duty Cost") AS "Total Duty",
+               sum(h."Total Landed Cost") AS "Total Landed Cost"
+        FROM duty_history h
+        LEFT JOIN tariffs t ON t."HTS Number" = h."HTS Code"
+        GROUP BY h."HTS Code"
+        ORDER BY "Total Duty" DESC
+        LIMIT ?
+    """, [limit]).df()
+
+
+def duty_by_chapter_month(conn=None):
+    """Total duty per HTS chapter per month; entries saved without a Timestamp have a NULL month."""
+    conn = conn or connect_analytics()
+    return conn.execute("""
+        SELECT chapter AS "Chapter", month AS "Month", count(*) AS "Entries",
+               sum("Duty Cost") AS "Total Duty"
+        FROM duty_history
+        GROUP BY ALL
+        ORDER BY "Chapter", "Month"
+    """).df()
+
+
+def spend_by_user(conn=None):
+    """Per-user totals of duty and landed cost across all saved calculations."""
+    conn = conn or connect_analytics()
+    return conn.execute("""
+        SELECT user_id AS "User ID", count(*) AS "Entries",
+               sum("Duty Cost") AS "Total Duty", sum("Total Landed Cost") AS "Total Landed Cost"
+        FROM duty_history
+        GROUP BY ALL
+        ORDER BY "Total Landed Cost" DESC
+    """).df()
@@ -0,0 +1,74 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+ANSWER_CACHE_SIZE = 256
+# Seconds an answer is served from the cache before it is looked up again.
+ANSWER_CACHE_TTL = 600
+
+
+def normalize_query(query):
+    """Cache key for a question: case, punctuation and runs of whitespace are ignored.
+
+    "US-Israel FTA?" and "us israel  fta" share a key.
+    """
+    return " ".join(re.findall(r"\w+", query.lower()))
+
+
+class AnswerCache:
+    """Bounded LRU cache of answers with a time-to-live and a corpus version.
+
+    Every entry is stored with the corpus version it was answered from; get()
+    drops the whole cache when it is asked with a different version, so a
+    re-ingested corpus is never answered from stale entries. `hits` and
+    `misses` count get() results.
+    """
+
+    def __init__(self, max_size=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+
+    def get(self, query, version=None):
+        """Return the cached answer for query, or None."""
+        key = normalize_query(query)
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, query, answer, version=None):
+        """Cache answer for query, evicting the least recently used entry when full."""
+        key = normalize_query(query)
+        with self._lock:
+            if version != self._version:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, answer)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Counters for monitoring: hits, misses, hit rate and current size."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / total if total else 0.0, "size": len(self._entries)}
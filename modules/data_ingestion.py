@@ -2,15 +2,25 @@ import sqlite3
 from langchain.document_loaders import PyPDFLoader
 from langchain.vectorstores import FAISS
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+import numpy as np
 import pandas as pd
+from modules.embeddings import VECTOR_STORE_PATH, get_embeddings, report_cache_hit_rate, save_embedding_backend
 
+INGEST_CHUNK_SIZE = 50_000
 
-def ingest_csv_to_db(csv_file_path, db_file_path):
-    """Load CSV data into SQLite database."""
+
+def ingest_csv_to_db(csv_file_path, db_file_path, incremental=False, key_column=None, table_name="documents"):
+    """Load CSV data into SQLite database.
+
+    By default the table is dropped and rewritten. With incremental=True the CSV is
+    synced in place instead; see _ingest_csv_incremental.
+    """
+    if incremental:
+        return _ingest_csv_incremental(csv_file_path, db_file_path, table_name, key_column)
     conn = sqlite3.connect(db_file_path)
     try:
         data = pd.read_csv(csv_file_path)
-        data.to_sql("documents", conn, if_exists="replace", index=False)
+        data.to_sql(table_name, conn, if_exists="replace", index=False)
         print(f"CSV data from {csv_file_path} successfully loaded into {db_file_path}.")
     except Exception as e:
         print(f"Error ingesting CSV data: {e}")
@@ -18,11 +28,119 @@ def ingest_csv_to_db(csv_file_path, db_file_path):
         conn.close()
 
 
-def ingest_pdf_to_langchain(pdf_path):
-    """Load PDF data into LangChain vector store."""
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _ingest_csv_incremental(csv_file_path, db_file_path, table_name, key_column=None,
+                            chunk_size=INGEST_CHUNK_SIZE):
+    """Sync a CSV into table_name, writing only rows whose content changed.
+
+    Each row is keyed by key_column and stored with a 64-bit hash of its content.
+    Rows with an empty key, or every row when no key_column is given, are keyed by
+    that hash plus an occurrence count, so inserting or deleting other rows does
+    not shift their keys. The CSV is read in chunks into a temporary staging table;
+    its index is only built once the load is done. One transaction then upserts
+    the rows whose hash changed and deletes keys that are gone. The database runs
+    in WAL mode, so readers keep the previous revision until the commit. A table
+    whose columns do not match the CSV is rebuilt, as the default mode would.
+    Returns (inserted_or_updated, deleted) row counts.
+    """
+    conn = sqlite3.connect(db_file_path, isolation_level=None)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            columns = None
+            seen = {}
+            with pd.read_csv(csv_file_path, dtype=str, keep_default_na=False, chunksize=chunk_size) as reader:
+                for chunk in reader:
+                    if columns is None:
+                        columns = list(chunk.columns)
+                        _prepare_ingest_tables(conn, table_name, columns)
+                    hashes = pd.util.hash_pandas_object(chunk, index=False).to_numpy().view(np.int64)
+                    keys = _content_keys(hashes, seen, chunk.index)
+                    if key_column is not None:
+                        keys = chunk[key_column].where(chunk[key_column] != "", keys)
+                    placeholders = ", ".join("?" for _ in range(len(columns) + 2))
+                    conn.executemany(f"INSERT INTO temp.ingest_staging VALUES ({placeholders})",
+                                     zip(keys.tolist(), hashes.tolist(), *(chunk[column].tolist() for column in columns)))
+            if columns is None:
+                raise ValueError(f"'{csv_file_path}' has no header row.")
+
+            # Indexes are built after the bulk load rather than maintained row by row.
+            table = _quote(table_name)
+            conn.execute("CREATE INDEX temp.idx_ingest_staging_row_key ON ingest_staging (row_key)")
+            conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {_quote(f'idx_{table_name}_row_key')} ON {table} (row_key)")
+
+            before = conn.total_changes
+            column_list = ", ".join(["row_key", "row_hash"] + [_quote(column) for column in columns])
+            updates = ", ".join(f"{name} = excluded.{name}" for name in ["row_hash"] + [_quote(column) for column in columns])
+            # Later duplicates of a key win; unchanged rows are not rewritten.
+            conn.execute(f"""
+                INSERT INTO {table} ({column_list})
+                SELECT {column_list} FROM temp.ingest_staging
+                WHERE rowid IN (SELECT max(rowid) FROM temp.ingest_staging GROUP BY row_key)
+                ON CONFLICT (row_key) DO UPDATE SET {updates}
+                WHERE {table}.row_hash IS NOT excluded.row_hash
+            """)
+            upserted = conn.total_changes - before
+            before = conn.total_changes
+            conn.execute(f"DELETE FROM {table} WHERE row_key NOT IN (SELECT row_key FROM temp.ingest_staging)")
+            deleted = conn.total_changes - before
+            conn.execute("DROP TABLE temp.ingest_staging")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        print(f"CSV data from {csv_file_path} synced into {db_file_path}: "
+              f"{upserted} rows inserted or updated, {deleted} deleted.")
+        return upserted, deleted
+    except Exception as e:
+        print(f"Error ingesting CSV data: {e}")
+        return 0, 0
+    finally:
+        conn.close()
+
+
+def _content_keys(hashes, seen, index):
+    """Keys "#<hash>:<n>" for the n-th row with a given content hash; seen carries counts across chunks."""
+    hashes = pd.Series(hashes, index=index)
+    occurrence = hashes.groupby(hashes).cumcount() + hashes.map(seen).fillna(0).astype(np.int64)
+    for value, count in hashes.value_counts().items():
+        seen[value] = seen.get(value, 0) + count
+    return "#" + hashes.astype(str) + ":" + occurrence.astype(str)
+
+
+def _prepare_ingest_tables(conn, table_name, columns):
+    """Create the staging table, and the target table unless it already matches the CSV's columns."""
+    column_sql = ", ".join(["row_key TEXT", "row_hash INTEGER"] + [f"{_quote(column)} TEXT" for column in columns])
+    conn.execute("DROP TABLE IF EXISTS temp.ingest_staging")
+    conn.execute(f"CREATE TEMP TABLE ingest_staging ({column_sql})")
+
+    existing = [row[1] for row in conn.execute(f"PRAGMA table_info({_quote(table_name)})")]
+    if existing and existing != ["row_key", "row_hash"] + columns:
+        conn.execute(f"DROP TABLE {_quote(table_name)}")
+        existing = []
+    if not existing:
+        conn.execute(f"CREATE TABLE {_quote(table_name)} ({column_sql})")
+
+
+def ingest_pdf_to_langchain(pdf_path, embedding_backend=None):
+    """Load PDF data into LangChain vector store.
+
+    Chunks are embedded in batches by embedding_backend (default: the
+    HTS_EMBEDDING_BACKEND setting, see modules.embeddings), which is recorded
+    with the store so queries use the same one. Chunks already in the embedding
+    cache are not embedded again.
+    """
     loader = PyPDFLoader(pdf_path)
     splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
     documents = loader.load_and_split(splitter)
-    vector_store = FAISS.from_documents(documents)
-    vector_store.save_local("data/vectorstore")
+    embeddings = get_embeddings(embedding_backend)
+    vector_store = FAISS.from_documents(documents, embeddings)
+    # The backend is recorded first: rag_tool reloads when the index files change.
+    save_embedding_backend(VECTOR_STORE_PATH, embedding_backend)
+    vector_store.save_local(VECTOR_STORE_PATH)
+    report_cache_hit_rate(embeddings, pdf_path)
     print(f"PDF data from {pdf_path} successfully ingested into LangChain vector store.")
\ No newline at end of file
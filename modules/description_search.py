@@ -0,0 +1,133 @@
+import math
+import re
+import threading
+
+import numpy as np
+
+from modules.prepare_db import clean_description, get_tariff_index
+
+SEARCH_LIMIT = 10
+# Weight of words inherited from headings above a line, relative to its own words.
+PARENT_CONTEXT_WEIGHT = 0.5
+# BM25 term-frequency saturation and length normalization.
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "for", "from", "in", "into", "is", "it",
+    "not", "of", "on", "or", "other", "than", "the", "thereof", "to", "whether", "with",
+}
+
+_index_lock = threading.Lock()
+_search_index = None
+
+
+def stem(word):
+    """Light suffix-stripping stemmer that maps singular and plural forms together.
+
+    'feathers' -> 'feather', 'bristles'/'bristle' -> 'bristl', 'dried' -> 'dry',
+    'casings' -> 'casing', 'boxes' -> 'box'.
+    """
+    if len(word) > 4 and word.endswith(("ies", "ied")):
+        return word[:-3] + "y"
+    if word.endswith(("sses", "xes", "zes", "ches", "shes")):
+        word = word[:-2]
+    elif word.endswith("s") and not word.endswith(("ss", "us", "is")) and len(word) > 3:
+        word = word[:-1]
+    elif word.endswith("ed") and len(word) > 4:
+        word = word[:-2]
+    if word.endswith("e") and len(word) > 3:
+        word = word[:-1]
+    return word
+
+
+def tokenize(text):
+    """Lower-case, drop '<br />' markup and stopwords, and stem the remaining words."""
+    words = re.findall(r"[a-z]+", clean_description(text).lower())
+    return [stem(word) for word in words if word not in STOPWORDS and len(word) > 1]
+
+
+class DescriptionIndex:
+    """Inverted index from stemmed description words to coded tariff lines.
+
+    A line is indexed under its own words and, at PARENT_CONTEXT_WEIGHT, under the
+    words of every heading above it, so "Feather meal" (indent 3) is found for
+    "feather meal waste". Each posting holds the term's precomputed BM25 weight
+    for the line, so a search is NumPy scatter-adds over the postings of the
+    query's terms only.
+    """
+
+    def __init__(self, tariff_index):
+        self.digest = tariff_index.digest
+        data = tariff_index.data
+        self.codes = data["HTS Number"].tolist()
+        self.descriptions = [clean_description(text) for text in data["Description"]]
+        own_terms = [tokenize(text) for text in data["Description"]]
+
+        context = [set() for _ in own_terms]
+        for position, parent in enumerate(tariff_index.parents.tolist()):
+            if parent >= 0:
+                context[position] = context[parent] | set(own_terms[parent])
+
+        line_terms = {}
+        for position, code in enumerate(self.codes):
+            if not code:
+                continue
+            weights = dict.fromkeys(context[position], PARENT_CONTEXT_WEIGHT)
+            for term in own_terms[position]:
+                weights[term] = weights.get(term, PARENT_CONTEXT_WEIGHT) + 1.0
+            line_terms[position] = weights
+
+        line_count = len(line_terms) or 1
+        average_length = sum(sum(weights.values()) for weights in line_terms.values()) / line_count or 1.0
+        postings = {}
+        for position, weights in line_terms.items():
+            length_norm = BM25_K1 * (1 - BM25_B + BM25_B * sum(weights.values()) / average_length)
+            for term, tf in weights.items():
+                positions, values = postings.setdefault(term, ([], []))
+                positions.append(position)
+                values.append(tf * (BM25_K1 + 1) / (tf + length_norm))
+
+        self.postings = {}
+        for term, (positions, values) in postings.items():
+            idf = math.log(1 + (line_count - len(positions) + 0.5) / (len(positions) + 0.5))
+            self.postings[term] = (np.array(positions, dtype=np.int32), np.array(values, dtype=np.float32) * idf)
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """Return up to `limit` (HTS Number, description, score) tuples, best first."""
+        terms = [term for term in dict.fromkeys(tokenize(query)) if term in self.postings]
+        if not terms:
+            return []
+        scores = np.zeros(len(self.codes), dtype=np.float32)
+        for term in terms:
+            positions, weights = self.postings[term]
+            np.add.at(scores, positions, weights)
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit)[:limit]]
+        # Best score first; ties keep schedule order.
+        candidates = candidates[np.lexsort((candidates, -scores[candidates]))]
+        return [(self.codes[i], self.descriptions[i], float(scores[i])) for i in candidates]
+
+
+def get_description_index():
+    """Return the description index for the current tariff schedule, rebuilding it after a CSV change."""
+    global _search_index
+    tariff_index = get_tariff_index()
+    index = _search_index
+    if index is None or index.digest != tariff_index.digest:
+        with _index_lock:
+            index = _search_index
+            if index is None or index.digest != tariff_index.digest:
+                index = _search_index = DescriptionIndex(tariff_index)
+    return index
+
+
+def search_hts_by_description(query, limit=SEARCH_LIMIT):
+    """Find HTS codes for a product description; returns (HTS Number, description, score) tuples."""
+    try:
+        return get_description_index().search(query, limit)
+    except Exception as e:
+        print(f"Error searching descriptions: {e}")
+        return []
@@ -0,0 +1,78 @@
+import os
+import re
+import sqlite3
+import threading
+
+from modules.sqlite_pool import read_connection
+
+DB_PATH = os.path.join(os.path.dirname(__file__), "hts_data.db")
+SEARCH_LIMIT = 5
+
+_fts_lock = threading.Lock()
+_fts_ready = set()
+
+
+def ensure_documents_fts(conn):
+    """Create the documents_fts index over documents.content and the triggers that keep it in sync.
+
+    documents_fts is an external-content FTS5 table, so passages are not stored twice.
+    When the index is first created over existing rows it is rebuilt from them.
+    """
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'documents_fts'").fetchone()
+    with conn:
+        conn.executescript("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+                content, content = 'documents', content_rowid = 'id', tokenize = 'porter unicode61'
+            );
+            CREATE TRIGGER IF NOT EXISTS documents_fts_insert AFTER INSERT ON documents BEGIN
+                INSERT INTO documents_fts (rowid, content) VALUES (new.id, new.content);
+            END;
+            CREATE TRIGGER IF NOT EXISTS documents_fts_delete AFTER DELETE ON documents BEGIN
+                INSERT INTO documents_fts (documents_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            END;
+            CREATE TRIGGER IF NOT EXISTS documents_fts_update AFTER UPDATE ON documents BEGIN
+                INSERT INTO documents_fts (documents_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                INSERT INTO documents_fts (rowid, content) VALUES (new.id, new.content);
+            END;
+        """)
+        if not exists:
+            conn.execute("INSERT INTO documents_fts (documents_fts) VALUES ('rebuild')")
+
+
+def ensure_documents_index(db_path):
+    """Run ensure_documents_fts once per database per process."""
+    if db_path in _fts_ready:
+        return
+    with _fts_lock:
+        if db_path not in _fts_ready:
+            conn = sqlite3.connect(db_path)
+            try:
+                ensure_documents_fts(conn)
+            finally:
+                conn.close()
+            _fts_ready.add(db_path)
+
+
+def fts_match_expression(query):
+    """Turn free text into an FTS5 query that matches any of its words.
+
+    Each word is quoted, so punctuation and FTS operators in user input are
+    treated as plain text. Returns "" when the query has no words.
+    """
+    return " OR ".join(f'"{word}"' for word in re.findall(r"\w+", query.lower()))
+
+
+def search_documents(query, k=SEARCH_LIMIT, db_path=DB_PATH):
+    """Return up to k (content, score) pairs for query, best first, ranked by BM25.
+
+    score is the negated bm25() value, so higher means more relevant.
+    """
+    match = fts_match_expression(query)
+    if not match:
+        return []
+    ensure_documents_index(db_path)
+    rows = read_connection(db_path).execute(
+        "SELECT content, bm25(documents_fts) FROM documents_fts WHERE documents_fts MATCH ? ORDER BY rank LIMIT ?",
+        (match, k),
+    ).fetchall()
+    return [(content, -score) for content, score in rows]
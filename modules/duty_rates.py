@@ -0,0 +1,253 @@
+import functools
+import re
+
+import numpy as np
+import pandas as pd
+
+# Rate-kind codes stored alongside each parsed rate column.
+RATE_NONE = 0
+RATE_FREE = 1
+RATE_AD_VALOREM = 2
+RATE_SPECIFIC = 3
+RATE_COMPOUND = 4
+RATE_OTHER = 5
+
+# Source column -> prefix of the typed columns derived from it.
+RATE_COLUMNS = {
+    "General Rate of Duty": "General",
+    "Special Rate of Duty": "Special",
+    "Column 2 Rate of Duty": "Column 2",
+}
+# Typed columns added per prefix, e.g. "General Ad Valorem".
+PARSED_SUFFIXES = ("Ad Valorem", "Specific", "Specific Unit", "Rate Kind")
+
+_NUMBER = r"(\d+(?:\.\d+)?)"
+_AD_VALOREM_TERM = re.compile(rf"^{_NUMBER}\s*%$")
+# A unit is one token ("kg", "doz.", "No.") or a proof liter; any further text is not a plain rate.
+_UNIT = r"((?:pf\.\s?)?[^\s+]+?)\.?"
+_CENTS_TERM = re.compile(rf"^{_NUMBER}\s*¢\s*/\s*{_UNIT}$")
+_DOLLARS_TERM = re.compile(rf"^\$\s*{_NUMBER}\s*/\s*{_UNIT}$")
+_PROGRAM_CODE = r"[A-Z][A-Z0-9]*[*+]?"
+# Texts made only of "rate (program list)" groups, as in the Special column.
+_PROGRAM_GROUPS = re.compile(rf"^(?:[^()]*\(\s*{_PROGRAM_CODE}(?:\s*,\s*{_PROGRAM_CODE})*\s*\)\s*)+$")
+
+
+class DutyRate:
+    """A compiled duty-rate expression: an ad valorem share plus a specific amount per unit.
+
+    "5% + 10¢/kg" compiles to ad_valorem=0.05, specific=0.10 (dollars) and unit="kg".
+    """
+
+    __slots__ = ("text", "kind", "ad_valorem", "specific", "unit")
+
+    def __init__(self, text, kind, ad_valorem=0.0, specific=0.0, unit=""):
+        self.text = text
+        self.kind = kind
+        self.ad_valorem = ad_valorem
+        self.specific = specific
+        self.unit = unit
+
+    def evaluate(self, value, quantity=0.0):
+        """Duty owed on customs value(s) and quantities in this rate's unit; broadcasts over arrays."""
+        return evaluate_duty(self.ad_valorem, self.specific, value, quantity)
+
+    def __repr__(self):
+        return f"DutyRate({self.text!r}, ad_valorem={self.ad_valorem}, specific={self.specific}, unit={self.unit!r})"
+
+
+def evaluate_duty(ad_valorem, specific, value, quantity=0.0):
+    """Duty for rate components and values/quantities given as scalars or NumPy arrays."""
+    return np.asarray(value, dtype=float) * ad_valorem + np.asarray(quantity, dtype=float) * specific
+
+
+def parsed_rate_column_names():
+    """Names of every typed column add_parsed_rate_columns can add."""
+    return [f"{prefix} {suffix}" for prefix in RATE_COLUMNS.values() for suffix in PARSED_SUFFIXES]
+
+
+@functools.lru_cache(maxsize=4096)
+def compile_rate(text):
+    """Compile a published rate text into a DutyRate.
+
+    Handles "Free", ad valorem ("1.4%"), specific ("0.8¢/kg", "$1.35/doz",
+    "5¢/No.") and compound ("5% + 10¢/kg") forms. The program lists of a Special
+    text such as "Free (A,AU,...)" are ignored. Anything else, such as references to
+    chapter 99, sugar-degree formulas or specific terms in two different units,
+    compiles to RATE_OTHER with no duty.
+    """
+    text = "" if text is None else str(text)
+    # Special rates read "Free (A,AU,...)": the rate is the part before the program list.
+    # Other parentheses, such as the sugar-degree provisos, are part of the rate text.
+    rate = text.split("(", 1)[0].strip() if _PROGRAM_GROUPS.match(text) else text.strip()
+    if not rate:
+        return DutyRate(text, RATE_NONE)
+    if rate.lower() == "free":
+        return DutyRate(text, RATE_FREE)
+
+    ad_valorem = specific = 0.0
+    unit = None
+    has_ad_valorem = has_specific = False
+    for term in rate.split("+"):
+        term = term.strip()
+        match = _AD_VALOREM_TERM.match(term)
+        if match:
+            ad_valorem += float(match.group(1)) / 100
+            has_ad_valorem = True
+            continue
+        match = _CENTS_TERM.match(term) or _DOLLARS_TERM.match(term)
+        if match:
+            amount = float(match.group(1))
+            if "¢" in term:
+                amount /= 100
+            term_unit = match.group(2)
+            if unit is not None and term_unit != unit:
+                return DutyRate(text, RATE_OTHER)
+            unit = term_unit
+            specific += amount
+            has_specific = True
+            continue
+        try:
+            # A bare number is taken as an ad valorem fraction, as parse_duty_rate does.
+            ad_valorem += float(term)
+            has_ad_valorem = True
+        except ValueError:
+            return DutyRate(text, RATE_OTHER)
+
+    if has_ad_valorem and has_specific:
+        kind = RATE_COMPOUND
+    elif has_specific:
+        kind = RATE_SPECIFIC
+    else:
+        kind = RATE_AD_VALOREM
+    return DutyRate(text, kind, ad_valorem, specific, unit or "")
+
+
+def parse_rate_column(rates):
+    """Parse a whole column of duty-rate strings in one pass.
+
+    Schedules repeat a few hundred distinct rate texts across tens of thousands of
+    lines, so each distinct text is compiled once and the components are gathered
+    back by code. Categorical columns (as read by load_tariff_data) reuse their
+    codes; anything else is factorized first.
+    Returns a dict of per-row arrays keyed by PARSED_SUFFIXES: float64 ad valorem
+    fractions, float64 specific dollars per unit, the specific unit and int8
+    RATE_* kind codes.
+    """
+    rates = pd.Series(rates)
+    if isinstance(rates.dtype, pd.CategoricalDtype):
+        codes = rates.cat.codes.to_numpy()
+        uniques = rates.cat.categories.to_numpy(dtype=object)
+    else:
+        codes, uniques = pd.factorize(rates.to_numpy(dtype=object))
+    # Missing values have code -1, which lands on the trailing empty rate.
+    compiled = [compile_rate(text) for text in uniques] + [compile_rate("")]
+    return {
+        "Ad Valorem": np.array([rate.ad_valorem for rate in compiled], dtype=np.float64)[codes],
+        "Specific": np.array([rate.specific for rate in compiled], dtype=np.float64)[codes],
+        "Specific Unit": np.array([rate.unit for rate in compiled], dtype=object)[codes],
+        "Rate Kind": np.array([rate.kind for rate in compiled], dtype=np.int8)[codes],
+    }
+
+
+def add_parsed_rate_columns(tariff_data):
+    """Add the '<prefix> <suffix>' typed columns for every rate column present."""
+    for column, prefix in RATE_COLUMNS.items():
+        if column not in tariff_data:
+            continue
+        for suffix, values in parse_rate_column(tariff_data[column]).items():
+            tariff_data[f"{prefix} {suffix}"] = values
+    return tariff_data
+
+
+_PROGRAM_GROUP = re.compile(r"([^()]*)\(([^)]*)\)")
+
+
+def parse_program_groups(text):
+    """Split a Special rate text into (DutyRate, [program codes]) groups.
+
+    "Free (A,AU,BH) 2.5% (JP)" -> [(Free, ["A", "AU", "BH"]), (2.5%, ["JP"])].
+    Program codes are kept verbatim, so "A*" and "A+" are distinct from "A".
+    """
+    groups = []
+    for rate, programs in _PROGRAM_GROUP.findall(text or ""):
+        codes = [code.strip() for code in programs.split(",") if code.strip()]
+        if codes:
+            groups.append((compile_rate(rate.strip()), codes))
+    return groups
+
+
+class ProgramIndex:
+    """Preferential program eligibility parsed from the Special Rate of Duty column.
+
+    Every program code gets one bit. Each tariff line carries a uint64 mask of the
+    programs it lists (`masks`), so "is line X eligible under KR" is a single AND.
+    Distinct Special texts are parsed once into up to `group_masks.shape[1]` rate
+    groups; `text_codes` maps each line to its text, so the rate for a line and a
+    program is found in O(1) and whole batches resolve with array gathers. Groups
+    whose rate does not compile (RATE_OTHER, e.g. "See 9823.04.xx") get no mask
+    bits, so claiming their programs leaves the line at its non-preferential rate.
+    """
+
+    def __init__(self, special_rates):
+        special_rates = pd.Series(special_rates)
+        if isinstance(special_rates.dtype, pd.CategoricalDtype):
+            codes = special_rates.cat.codes.to_numpy()
+            uniques = special_rates.cat.categories.to_numpy(dtype=object)
+        else:
+            codes, uniques = pd.factorize(special_rates.to_numpy(dtype=object))
+        # Missing values have code -1, which lands on the trailing empty text.
+        parsed = [parse_program_groups(text) for text in uniques] + [[]]
+
+        self.programs = sorted({code for groups in parsed for _, group in groups for code in group})
+        if len(self.programs) > 64:
+            raise ValueError(f"Too many special programs for a 64-bit mask: {len(self.programs)}")
+        self.bits = {code: np.uint64(1) << np.uint64(bit) for bit, code in enumerate(self.programs)}
+
+        width = max((len(groups) for groups in parsed), default=0) or 1
+        self.group_masks = np.zeros((len(parsed), width), dtype=np.uint64)
+        self.group_ad_valorem = np.zeros((len(parsed), width), dtype=np.float64)
+        self.group_specific = np.zeros((len(parsed), width), dtype=np.float64)
+        self.group_units = np.full((len(parsed), width), "", dtype=object)
+        for text_code, groups in enumerate(parsed):
+            for slot, (rate, group) in enumerate(groups):
+                if rate.kind in (RATE_NONE, RATE_OTHER):
+                    continue
+                for code in group:
+                    self.group_masks[text_code, slot] |= self.bits[code]
+                self.group_ad_valorem[text_code, slot] = rate.ad_valorem
+                self.group_specific[text_code, slot] = rate.specific
+                self.group_units[text_code, slot] = rate.unit
+        self.text_codes = np.where(codes < 0, len(parsed) - 1, codes).astype(np.int32)
+        self.masks = np.bitwise_or.reduce(self.group_masks, axis=1)[self.text_codes]
+
+    def inherit(self, rate_sources):
+        """Give every line the Special text of the line its rates come from."""
+        self.text_codes = self.text_codes[rate_sources]
+        self.masks = self.masks[rate_sources]
+
+    def program_mask(self, programs):
+        """OR of the bits for the given program codes; unknown codes contribute nothing."""
+        mask = np.uint64(0)
+        for code in programs:
+            mask |= self.bits.get(code, np.uint64(0))
+        return mask
+
+    def resolve(self, positions, claimed_masks, units=False):
+        """Vectorized preferential rates for tariff lines under claimed programs.
+
+        positions are row positions (-1 for unknown codes) and claimed_masks the
+        program mask claimed for each line. Returns (eligible, ad_valorem, specific),
+        plus the specific rates' units when units is True; where a line lists the
+        program in several groups the first group wins.
+        """
+        positions = np.asarray(positions)
+        claimed_masks = np.broadcast_to(np.asarray(claimed_masks, dtype=np.uint64), positions.shape)
+        text_codes = np.where(positions >= 0, self.text_codes[positions], len(self.group_masks) - 1)
+        matches = (self.group_masks[text_codes] & claimed_masks[:, None]) != 0
+        eligible = matches.any(axis=1) & (positions >= 0)
+        slot = matches.argmax(axis=1)
+        ad_valorem = np.where(eligible, self.group_ad_valorem[text_codes, slot], 0.0)
+        specific = np.where(eligible, self.group_specific[text_codes, slot], 0.0)
+        if units:
+            return eligible, ad_valorem, specific, np.where(eligible, self.group_units[text_codes, slot], "")
+        return eligible, ad_valorem, specific
@@ -0,0 +1,216 @@
+import functools
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import zlib
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# "openai" calls the OpenAI API; "hashing" and "huggingface" run on the local CPU with no network.
+EMBEDDING_BACKEND = os.environ.get("HTS_EMBEDDING_BACKEND", "openai")
+# Directory of a sentence-transformers model for the "huggingface" backend, e.g. models/all-MiniLM-L6-v2.
+EMBEDDING_MODEL_PATH = os.environ.get("HTS_EMBEDDING_MODEL", "")
+EMBEDDING_BATCH_SIZE = 256
+HASHING_DIMENSIONS = 1024
+# Where ingest_pdf_to_langchain saves the FAISS store and rag_tool loads it from.
+VECTOR_STORE_PATH = os.path.join(os.path.dirname(__file__), "data/vectorstore")
+# Written next to a saved vector store so queries embed with the backend that built it.
+EMBEDDING_INFO_FILE = "embedding_backend.txt"
+# SQLite database caching embeddings by (model id, text hash); set HTS_EMBEDDING_CACHE="" to disable.
+EMBEDDING_CACHE_PATH = os.environ.get("HTS_EMBEDDING_CACHE",
+                                      os.path.join(os.path.dirname(__file__), "vector_data.db"))
+# Hashes per SELECT ... IN (...), below SQLite's bound-parameter limit.
+CACHE_LOOKUP_BATCH = 500
+# Files of a local model that determine its vectors: configs and weights.
+MODEL_FILE_SUFFIXES = (".json", ".safetensors", ".bin")
+
+
+@functools.lru_cache(maxsize=200_000)
+def _feature_hash(feature):
+    # crc32 is stable across processes, unlike hash(), so saved indexes stay valid.
+    return zlib.crc32(feature.encode("utf-8"))
+
+
+class HashingEmbeddings(Embeddings):
+    """Offline embeddings from hashed word unigrams and bigrams (the hashing trick).
+
+    Every feature adds +1 or -1 (from one hash bit) to one of `dimensions` buckets.
+    Counts are log-scaled and each vector is L2-normalized, so FAISS L2 search
+    ranks by cosine similarity. There is no vocabulary or model to fit: texts are
+    embedded independently in batches of NumPy scatter-adds.
+    """
+
+    def __init__(self, dimensions=HASHING_DIMENSIONS, batch_size=EMBEDDING_BATCH_SIZE):
+        self.dimensions = dimensions
+        self.batch_size = batch_size
+
+    def embed_documents(self, texts):
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(self._embed_batch(texts[start:start + self.batch_size]).tolist())
+        return vectors
+
+    def embed_query(self, text):
+        return self._embed_batch([text])[0].tolist()
+
+    def _embed_batch(self, texts):
+        rows, hashes = [], []
+        for row, text in enumerate(texts):
+            words = re.findall(r"\w+", text.lower())
+            features = words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+            rows.extend([row] * len(features))
+            hashes.extend(_feature_hash(feature) for feature in features)
+        hashes = np.array(hashes, dtype=np.uint32)
+        signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+        matrix = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        np.add.at(matrix, (np.array(rows, dtype=np.intp), hashes % self.dimensions), signs)
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms > 0, norms, 1.0)
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings provider wrapped in a persistent, content-addressed cache.
+
+    Vectors are stored as float32 blobs in the embedding_cache table of db_path,
+    keyed by (model_id, SHA-256 of the text). Only texts missing from the cache
+    are passed to the wrapped provider, in one batched embed_documents call, and
+    repeated texts within a call are embedded once. `hits` and `misses` count
+    texts served from and added to the cache since the provider was created.
+    """
+
+    def __init__(self, embeddings, model_id, db_path=EMBEDDING_CACHE_PATH):
+        self.embeddings = embeddings
+        self.model_id = model_id
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS embedding_cache (
+                    model_id TEXT NOT NULL,
+                    text_hash BLOB NOT NULL,
+                    vector BLOB NOT NULL,
+                    PRIMARY KEY (model_id, text_hash)
+                ) WITHOUT ROWID
+            """)
+
+    def embed_documents(self, texts):
+        hashes = [hashlib.sha256(text.encode("utf-8")).digest() for text in texts]
+        vectors = self._cached(set(hashes))
+        missing = {digest: text for digest, text in zip(hashes, texts) if digest not in vectors}
+        if missing:
+            embedded = self.embeddings.embed_documents(list(missing.values()))
+            rows = [(self.model_id, digest, np.asarray(vector, dtype=np.float32).tobytes())
+                    for digest, vector in zip(missing, embedded)]
+            with self._lock, self._conn:
+                self._conn.executemany("INSERT OR IGNORE INTO embedding_cache VALUES (?, ?, ?)", rows)
+            vectors.update(zip(missing, embedded))
+        with self._lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        return [list(vectors[digest]) for digest in hashes]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    def _cached(self, hashes):
+        """{text hash: vector} for the hashes already in the cache."""
+        hashes = list(hashes)
+        vectors = {}
+        with self._lock:
+            for start in range(0, len(hashes), CACHE_LOOKUP_BATCH):
+                batch = hashes[start:start + CACHE_LOOKUP_BATCH]
+                placeholders = ", ".join("?" for _ in batch)
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embedding_cache WHERE model_id = ? AND text_hash IN ({placeholders})",
+                    [self.model_id, *batch],
+                ).fetchall()
+                vectors.update((digest, np.frombuffer(vector, dtype=np.float32).tolist()) for digest, vector in rows)
+        return vectors
+
+    def hit_rate(self):
+        """Share of texts served from the cache so far (0.0 before any call)."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        """Counters for monitoring: hits, misses and hit rate."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hit_rate()}
+
+
+def _model_digest(model_path):
+    """SHA-256 over the config and weight files of a local model directory, by relative path."""
+    digest = hashlib.sha256()
+    for root, dirs, names in os.walk(model_path):
+        dirs.sort()
+        for name in sorted(names):
+            if not name.endswith(MODEL_FILE_SUFFIXES):
+                continue
+            path = os.path.join(root, name)
+            digest.update(os.path.relpath(path, model_path).replace(os.sep, "/").encode("utf-8"))
+            with open(path, "rb") as file:
+                for block in iter(lambda: file.read(1 << 20), b""):
+                    digest.update(block)
+    return digest.hexdigest()
+
+
+def _provider(backend):
+    """(embeddings provider, model id) for a backend name."""
+    if backend == "hashing":
+        return HashingEmbeddings(), f"hashing-{HASHING_DIMENSIONS}"
+    if backend == "huggingface":
+        if not EMBEDDING_MODEL_PATH:
+            raise ValueError("Set HTS_EMBEDDING_MODEL to a local sentence-transformers model directory.")
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+        embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_PATH,
+                                           encode_kwargs={"batch_size": EMBEDDING_BATCH_SIZE})
+        # Keyed by location and content, so same-named directories never share cached vectors.
+        model_path = os.path.normcase(os.path.abspath(EMBEDDING_MODEL_PATH))
+        return embeddings, f"huggingface:{model_path}:{_model_digest(model_path)[:16]}"
+    if backend == "openai":
+        from langchain_community.embeddings import OpenAIEmbeddings
+        embeddings = OpenAIEmbeddings(chunk_size=EMBEDDING_BATCH_SIZE)
+        return embeddings, f"openai:{embeddings.model}"
+    raise ValueError(f"Unknown embedding backend '{backend}'.")
+
+
+@functools.lru_cache(maxsize=None)
+def get_embeddings(backend=None):
+    """Return the embeddings provider for backend (default EMBEDDING_BACKEND), created once per process.
+
+    Unless EMBEDDING_CACHE_PATH is empty, the provider is wrapped in CachedEmbeddings.
+    """
+    embeddings, model_id = _provider(backend or EMBEDDING_BACKEND)
+    if EMBEDDING_CACHE_PATH:
+        return CachedEmbeddings(embeddings, model_id)
+    return embeddings
+
+
+def report_cache_hit_rate(embeddings, label):
+    """Print the cache hit rate of a provider from get_embeddings, if it is cached."""
+    if isinstance(embeddings, CachedEmbeddings):
+        print(f"{label}: embedding cache hit rate {embeddings.hit_rate():.1%} "
+              f"({embeddings.hits} hits, {embeddings.misses} misses).")
+
+
+def save_embedding_backend(vector_store_path, backend=None):
+    """Record the backend a vector store was built with."""
+    os.makedirs(vector_store_path, exist_ok=True)
+    with open(os.path.join(vector_store_path, EMBEDDING_INFO_FILE), "w") as file:
+        file.write(backend or EMBEDDING_BACKEND)
+
+
+def load_embedding_backend(vector_store_path):
+    """Backend recorded for a vector store; stores saved before it was recorded used OpenAI."""
+    path = os.path.join(vector_store_path, EMBEDDING_INFO_FILE)
+    if not os.path.exists(path):
+        return "openai"
+    with open(path) as file:
+        return file.read().strip()
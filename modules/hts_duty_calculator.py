@@ -1,24 +1,131 @@
 import os
+import numpy as np
 import pandas as pd
 from fpdf import FPDF
 import json
-from modules.prepare_db import query_database
+from modules.prepare_db import query_database, get_tariff_index
+from modules.duty_rates import evaluate_duty
 
 MEMORY_FILE = "duty_memory.json"
+BATCH_COLUMNS = ["HTS Code", "Product Cost", "Freight", "Insurance"]
+# Optional batch columns; quantities are in the unit of the line's specific rate.
+QUANTITY_COLUMN = "Quantity"
+PROGRAM_COLUMN = "Program"
+ORIGIN_COLUMN = "Country of Origin"
 
-def handle_duty_calculation(hts_code, product_cost, freight, insurance):
-    """Calculate duty and total landed cost."""
+def _line_rates(tariff_index, positions, programs=None, origins=None, units=False):
+    """Return the (ad_valorem, specific) arrays that apply to each tariff line.
+
+    General rates apply by default. Origins in origin_rules.COLUMN_2_COUNTRIES pay
+    Column 2 rates; otherwise a program claimed explicitly or through the origin
+    country takes the line's Special rate when the line lists it. Everything is a
+    gather over precomputed arrays, with no per-line branching. With units=True
+    the units of the specific rates are returned as a third array.
+    """
+    data = tariff_index.data
+    found = positions >= 0
+
+    def column(name, default=0.0):
+        return np.where(found, data[name].to_numpy()[positions], default)
+
+    ad_valorem, specific = column("General Ad Valorem"), column("General Specific")
+    unit = column("General Specific Unit", "") if units else None
+    claimed = np.zeros(len(positions), dtype=np.uint64)
+    column_2 = np.zeros(len(positions), dtype=bool)
+    if origins is not None:
+        column_2, claimed = tariff_index.origins.resolve(origins)
+        ad_valorem = np.where(column_2, column("Column 2 Ad Valorem"), ad_valorem)
+        specific = np.where(column_2, column("Column 2 Specific"), specific)
+        if units:
+            unit = np.where(column_2, column("Column 2 Specific Unit", ""), unit)
+    if programs is not None:
+        codes, names = pd.factorize(pd.Series(programs, dtype=object).fillna("").astype(str).str.strip())
+        claimed = claimed | np.array([tariff_index.programs.program_mask([name]) for name in names], dtype=np.uint64)[codes]
+
+    eligible, special_ad_valorem, special_specific, *special_unit = \
+        tariff_index.programs.resolve(positions, claimed, units=units)
+    eligible &= ~column_2
+    ad_valorem = np.where(eligible, special_ad_valorem, ad_valorem)
+    specific = np.where(eligible, special_specific, specific)
+    if units:
+        return ad_valorem, specific, np.where(eligible, special_unit[0], unit)
+    return ad_valorem, specific
+
+def _applicable_rate(tariff_line, program=None, origin=None):
+    """Return (ad_valorem, specific, unit) of the rate that applies to a tariff row."""
+    rate = tariff_line["General Ad Valorem"], tariff_line["General Specific"], tariff_line["General Specific Unit"]
+    if program or origin:
+        tariff_index = get_tariff_index()
+        # Position of the row already found, whichever backend matched the code.
+        positions = tariff_index.lookup_positions([tariff_line["HTS Number"]])
+        if positions[0] >= 0:
+            rates = _line_rates(tariff_index, positions, programs=[program], origins=[origin], units=True)
+            rate = tuple(values[0] for values in rates)
+    return rate
+
+def rate_unit(hts_code, program=None, origin=None):
+    """Return the unit quantities are given in for hts_code, "" if its rate has no specific part."""
+    tariff_data = query_database(hts_code)
+    if tariff_data.empty:
+        return ""
+    return _applicable_rate(tariff_data.iloc[0], program, origin)[2]
+
+def handle_duty_calculation(hts_code, product_cost, freight, insurance, quantity=0.0, program=None, origin=None):
+    """Calculate duty and total landed cost.
+
+    quantity is only used by specific and compound rates (e.g. "5% + 10¢/kg") and
+    must be given in the unit of the rate that applies (see rate_unit).
+    program is a Special Rate of Duty program code such as "KR" and origin an ISO
+    country code; see _line_rates for how they select the rate column.
+    """
     tariff_data = query_database(hts_code)
     if tariff_data.empty:
         return {"Duty Cost": 0.0, "Total Landed Cost": 0.0}
 
     # Retrieve the duty rate
-    duty_rate = tariff_data.iloc[0]["General Rate of Duty"]
-    duty_cost = product_cost * duty_rate
+    ad_valorem, specific, _ = _applicable_rate(tariff_data.iloc[0], program, origin)
+    duty_cost = float(evaluate_duty(ad_valorem, specific, product_cost, quantity))
     total_cost = product_cost + freight + insurance + duty_cost
 
     return {"Duty Cost": round(duty_cost, 2), "Total Landed Cost": round(total_cost, 2)}
 
+def calculate_duties(line_items):
+    """Calculate duty and total landed cost for many line items at once.
+
+    line_items is a DataFrame, or a dict of equal-length arrays, with the
+    BATCH_COLUMNS and optionally QUANTITY_COLUMN for specific rates,
+    PROGRAM_COLUMN for claimed Special programs and ORIGIN_COLUMN for mixed
+    origins. The tariff table is joined once and the costs are computed as
+    array operations; unknown HTS codes get 0.0 duty and landed cost, as in
+    handle_duty_calculation. Returns the line items with "Duty Cost" and
+    "Total Landed Cost" columns added.
+    """
+    items = pd.DataFrame(line_items)
+    missing = [column for column in BATCH_COLUMNS if column not in items]
+    if missing:
+        raise ValueError(f"Missing line item columns: {', '.join(missing)}")
+
+    tariff_index = get_tariff_index()
+    positions = tariff_index.lookup_positions(items["HTS Code"])
+    found = positions >= 0
+    ad_valorem, specific = _line_rates(tariff_index, positions,
+                                       programs=items.get(PROGRAM_COLUMN), origins=items.get(ORIGIN_COLUMN))
+
+    product_cost = pd.to_numeric(items["Product Cost"], errors="coerce").fillna(0.0).to_numpy(dtype=float)
+    freight = pd.to_numeric(items["Freight"], errors="coerce").fillna(0.0).to_numpy(dtype=float)
+    insurance = pd.to_numeric(items["Insurance"], errors="coerce").fillna(0.0).to_numpy(dtype=float)
+    quantity = 0.0
+    if QUANTITY_COLUMN in items:
+        quantity = pd.to_numeric(items[QUANTITY_COLUMN], errors="coerce").fillna(0.0).to_numpy(dtype=float)
+
+    duty_cost = evaluate_duty(ad_valorem, specific, product_cost, quantity)
+    total_cost = np.where(found, product_cost + freight + insurance + duty_cost, 0.0)
+
+    result = items.copy()
+    result["Duty Cost"] = np.round(duty_cost, 2)
+    result["Total Landed Cost"] = np.round(total_cost, 2)
+    return result
+
 def export_results_to_file(memory, file_type):
     """Export memory to Excel or PDF."""
     if file_type == "excel":
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+# Countries denied normal trade relations are charged Column 2 rates.
+COLUMN_2_COUNTRIES = {"BY", "CU", "KP", "RU"}
+
+# Origin country (ISO 3166 alpha-2) -> Special-column program codes it can claim.
+# Covers the free trade agreements; unilateral preference programs (GSP, AGOA,
+# CBERA, ...) change beneficiaries yearly, so they are claimed explicitly: the
+# Duty Calculator's Special Program input or the batch Program column.
+COUNTRY_PROGRAMS = {
+    "AU": ["AU"],
+    "BH": ["BH"],
+    "CA": ["S", "S+"],
+    "CL": ["CL"],
+    "CO": ["CO"],
+    "CR": ["P", "P+"],
+    "DO": ["P", "P+"],
+    "GT": ["P", "P+"],
+    "HN": ["P", "P+"],
+    "IL": ["IL"],
+    "JO": ["JO"],
+    "JP": ["JP"],
+    "KR": ["KR"],
+    "MA": ["MA"],
+    "MX": ["S", "S+"],
+    "NI": ["P", "P+"],
+    "OM": ["OM"],
+    "PA": ["PA"],
+    "PE": ["PE"],
+    "SG": ["SG"],
+    "SV": ["P", "P+"],
+}
+
+COUNTRY_NAMES = {
+    "AU": "Australia", "BH": "Bahrain", "BY": "Belarus", "CA": "Canada", "CL": "Chile",
+    "CO": "Colombia", "CR": "Costa Rica", "CU": "Cuba", "DO": "Dominican Republic",
+    "GT": "Guatemala", "HN": "Honduras", "IL": "Israel", "JO": "Jordan", "JP": "Japan",
+    "KP": "North Korea", "KR": "South Korea", "MA": "Morocco", "MX": "Mexico",
+    "NI": "Nicaragua", "OM": "Oman", "PA": "Panama", "PE": "Peru", "RU": "Russia",
+    "SG": "Singapore", "SV": "El Salvador",
+}
+
+
+class OriginResolver:
+    """Per-country Column 2 flag and program mask, precomputed against a ProgramIndex.
+
+    Pricing a batch from mixed origins then needs no per-line branching: origins
+    are factorized, each distinct country is looked up once, and the results are
+    gathered back onto the lines.
+    """
+
+    def __init__(self, programs):
+        self.column_2 = {country: True for country in COLUMN_2_COUNTRIES}
+        self.masks = {country: programs.program_mask(codes) for country, codes in COUNTRY_PROGRAMS.items()}
+
+    def countries(self):
+        """Countries with a precomputed rule, sorted by code."""
+        return sorted(set(self.column_2) | set(self.masks))
+
+    def resolve(self, origins):
+        """Return (column_2, masks) for an array of ISO origin codes.
+
+        column_2 is True where the Column 2 rate applies; masks holds the Special
+        programs each origin may claim. Unknown origins get neither.
+        """
+        codes, countries = pd.factorize(pd.Series(origins, dtype=object).fillna("").astype(str).str.strip().str.upper())
+        column_2 = np.array([self.column_2.get(country, False) for country in countries], dtype=bool)
+        masks = np.array([self.masks.get(country, np.uint64(0)) for country in countries], dtype=np.uint64)
+        return column_2[codes], masks[codes]
@@ -1,12 +1,346 @@
+import bisect
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from collections import defaultdict
+
+import numpy as np
 import pandas as pd
 
+from modules.duty_rates import (RATE_COLUMNS, RATE_NONE, ProgramIndex, add_parsed_rate_columns, parse_rate_column,
+                                parsed_rate_column_names)
+from modules.origin_rules import OriginResolver
+from modules.sqlite_pool import read_connection
+from modules.tariff_snapshot import load_frame_snapshot, remove_stale_snapshots, save_frame_snapshot, snapshot_path
+
+TARIFF_CSV_PATH = "data/htsdata.csv"
+TARIFF_DB_PATH = os.path.join(os.path.dirname(__file__), "hts_data.db")
+COMPLETION_LIMIT = 10
+# "memory" looks codes up in the in-process TariffIndex, "sqlite" in TARIFF_DB_PATH.
+LOOKUP_BACKEND = os.environ.get("HTS_LOOKUP_BACKEND", "memory")
+
+_index_lock = threading.Lock()
+_tariff_index = None
+_sqlite_lock = threading.Lock()
+_sqlite_stamps = {}
+
+
+def normalize_hts_code(hts_code):
+    """Reduce an HTS code (or a typed prefix of one) to its digits: '0504.00.2' -> '0504002'."""
+    return re.sub(r"\D", "", hts_code or "")
+
+
+def clean_description(description):
+    """Turn the schedule's '<br />' line breaks into plain spaces."""
+    return " ".join(description.replace("<br />", " ").split())
+
+
+def build_hierarchy(indents, has_rate):
+    """Derive the HTS tree from the Indent column in one pass.
+
+    A line's parent is the closest earlier line with a smaller indent. Returns
+    (parents, rate_sources): the parent position of every line (-1 for top-level
+    lines) and the position of the line whose rates apply to it, which is the line
+    itself when it carries a rate and otherwise its parent's rate source.
+    """
+    parents = np.full(len(indents), -1, dtype=np.int32)
+    rate_sources = np.arange(len(indents), dtype=np.int32)
+    stack = []
+    for position, indent in enumerate(indents):
+        while stack and indents[stack[-1]] >= indent:
+            stack.pop()
+        if stack:
+            parents[position] = stack[-1]
+            if not has_rate[position]:
+                rate_sources[position] = rate_sources[stack[-1]]
+        stack.append(position)
+    return parents, rate_sources
+
+
+def rate_hierarchy(tariff_data):
+    """Return (parents, rate_sources, has_rate) for a parsed schedule; see build_hierarchy.
+
+    has_rate is read from the published General Rate of Duty text, so the result
+    is the same before and after inherit_rates.
+    """
+    has_rate = parse_rate_column(tariff_data["General Rate of Duty"])["Rate Kind"] != RATE_NONE
+    parents, rate_sources = build_hierarchy(tariff_data["Indent"].tolist(), has_rate)
+    return parents, rate_sources, has_rate
+
+
+def inherit_rates(tariff_data):
+    """Fill the typed rate columns of lines without a rate from their nearest rated ancestor.
+
+    Statistical suffix lines such as 0504.00.00.20 publish no rate of their own;
+    "Rate Source" names the ancestor whose rate they use. The published rate texts
+    are left untouched.
+    """
+    _, rate_sources, has_rate = rate_hierarchy(tariff_data)
+    for column in parsed_rate_column_names():
+        if column in tariff_data:
+            tariff_data[column] = tariff_data[column].to_numpy()[rate_sources]
+    tariff_data["Rate Source"] = np.where(has_rate[rate_sources],
+                                          tariff_data["HTS Number"].to_numpy(dtype=object)[rate_sources], "")
+    return tariff_data
+
+
+class TariffIndex:
+    """Parsed tariff schedule with O(1) lookups by HTS Number.
+
+    `data` comes from load_tariff_data, so statistical suffix lines already carry
+    their inherited typed rates (see inherit_rates). `programs` indexes the
+    preferential programs listed in the Special Rate of Duty column (see
+    duty_rates.ProgramIndex) and `origins` the per-country rules built on it
+    (see origin_rules.OriginResolver).
+    """
+
+    def __init__(self, file_name, stamp, digest, data):
+        self.file_name = file_name
+        self.stamp = stamp
+        self.digest = digest
+
+        self.parents, self.rate_sources, _ = rate_hierarchy(data)
+        self.programs = ProgramIndex(data["Special Rate of Duty"])
+        self.programs.inherit(self.rate_sources)
+        self.origins = OriginResolver(self.programs)
+        # data is not modified, so columns mapped from a snapshot stay shared with other processes.
+        self.data = data
+        # Keep the first row for a repeated code, like the old exact-match filter + iloc[0].
+        codes = data["HTS Number"].tolist()
+        self.positions = {}
+        for position, code in enumerate(codes):
+            if code and code not in self.positions:
+                self.positions[code] = position
+        self.code_index = pd.Index(list(self.positions), dtype=object)
+        self.code_positions = np.fromiter(self.positions.values(), dtype=np.int64, count=len(self.positions))
+        self._prefix_keys = None
+        self._prefix_positions = None
+
+    def lookup(self, hts_code):
+        """Return the tariff row for an HTS code as a one-row DataFrame (empty if unknown)."""
+        position = self.positions.get(hts_code.strip())
+        if position is None:
+            return self.data.iloc[0:0]
+        return self.data.iloc[[position]]
+
+    def lookup_positions(self, hts_codes):
+        """Map an array of HTS codes to row positions in self.data, -1 where unknown."""
+        codes = pd.Series(hts_codes, dtype=object).fillna("").astype(str).str.strip()
+        found = self.code_index.get_indexer(codes)
+        return np.where(found >= 0, self.code_positions[found], -1)
+
+    def program_rate(self, hts_code, program):
+        """Return (ad_valorem, specific) for hts_code under a Special program, or None if not eligible."""
+        position = self.positions.get(hts_code.strip())
+        if position is None:
+            return None
+        eligible, ad_valorem, specific = self.programs.resolve([position], [self.programs.program_mask([program])])
+        if not eligible[0]:
+            return None
+        return float(ad_valorem[0]), float(specific[0])
+
+    def complete(self, prefix, limit=COMPLETION_LIMIT):
+        """Return up to `limit` (HTS Number, description) pairs whose code starts with prefix.
+
+        Dots in the prefix are optional. Codes are kept sorted by their digits, so a
+        lookup is a binary search plus a short scan rather than a pass over the table.
+        """
+        key = normalize_hts_code(prefix)
+        if not key:
+            return []
+        if self._prefix_keys is None:
+            self._build_prefix_index()
+
+        keys = self._prefix_keys
+        start = bisect.bisect_left(keys, key)
+        descriptions = self.data["Description"]
+        completions = []
+        for i in range(start, min(start + limit, len(keys))):
+            if not keys[i].startswith(key):
+                break
+            position = self._prefix_positions[i]
+            completions.append((self.data["HTS Number"].iat[position], clean_description(descriptions.iat[position])))
+        return completions
+
+    def _build_prefix_index(self):
+        """Sort every code by its digits for complete(); built on first use."""
+        entries = sorted((normalize_hts_code(code), position) for code, position in self.positions.items())
+        self._prefix_positions = [position for _, position in entries]
+        self._prefix_keys = [key for key, _ in entries]
+
+    def ancestors(self, hts_code):
+        """Return the description path from the top-level heading down to hts_code.
+
+        The rows come back in tree order, ending with the code's own line; the result
+        is empty for an unknown code. Walks the parent pointers, O(depth).
+        """
+        position = self.positions.get(hts_code.strip())
+        path = []
+        while position is not None and position >= 0:
+            path.append(position)
+            position = self.parents[position]
+        return self.data.iloc[path[::-1]][["HTS Number", "Indent", "Description"]]
+
+
+def _file_stamp(file_name):
+    """Cheap change marker for a file: modification time and size."""
+    stat = os.stat(file_name)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _file_digest(file_name):
+    """SHA-256 of a file's content, read in blocks."""
+    digest = hashlib.sha256()
+    with open(file_name, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_tariff_csv(file_name=TARIFF_CSV_PATH):
+    """Read the HTS schedule CSV and add typed columns for its duty rates.
+
+    The published rate texts are kept as-is; see duty_rates.add_parsed_rate_columns
+    for the numeric columns and inherit_rates for lines without a rate.
+    """
+    # Rate texts repeat heavily, so read them as categoricals and parse each distinct value once.
+    dtypes = defaultdict(lambda: str, {column: "category" for column in RATE_COLUMNS})
+    tariff_data = pd.read_csv(file_name, dtype=dtypes, keep_default_na=False)
+    tariff_data["Indent"] = pd.to_numeric(tariff_data["Indent"], errors="coerce").fillna(0).astype("int16")
+    return inherit_rates(add_parsed_rate_columns(tariff_data))
+
+
+def load_tariff_data(file_name=TARIFF_CSV_PATH, digest=None):
+    """Load the parsed schedule, from its binary snapshot when one matches the CSV.
+
+    Snapshots are keyed by the CSV's content hash (see tariff_snapshot), so an
+    edited CSV is parsed again and a fresh snapshot replaces the old one. Numeric
+    columns loaded from a snapshot are read-only views of the mapped file, shared
+    by every process on the machine.
+    """
+    path = snapshot_path(file_name, digest or _file_digest(file_name))
+    if os.path.exists(path):
+        try:
+            return load_frame_snapshot(path)
+        except Exception as e:
+            print(f"Ignoring unreadable tariff snapshot '{path}': {e}")
+
+    tariff_data = read_tariff_csv(file_name)
+    try:
+        save_frame_snapshot(tariff_data, path)
+        remove_stale_snapshots(file_name, path)
+    except OSError as e:
+        print(f"Could not write tariff snapshot '{path}': {e}")
+    return tariff_data
+
+
+def get_tariff_index(file_name=TARIFF_CSV_PATH):
+    """Return the process-wide tariff index, rebuilding it when the CSV changes.
+
+    The file's mtime and size are checked on every call; the content hash is only
+    recomputed when they move, so touching the file without editing it is cheap.
+    """
+    global _tariff_index
+    stamp = _file_stamp(file_name)
+    index = _tariff_index
+    if index is not None and index.file_name == file_name and index.stamp == stamp:
+        return index
+
+    with _index_lock:
+        index = _tariff_index
+        if index is not None and index.file_name == file_name and index.stamp == stamp:
+            return index
+        digest = _file_digest(file_name)
+        if index is not None and index.file_name == file_name and index.digest == digest:
+            index.stamp = stamp
+        else:
+            index = TariffIndex(file_name, stamp, digest, load_tariff_data(file_name, digest))
+            _tariff_index = index
+    return index
+
+
+def _sqlite_type(dtype):
+    if pd.api.types.is_integer_dtype(dtype) or pd.api.types.is_bool_dtype(dtype):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(dtype):
+        return "REAL"
+    return "TEXT"
+
+
+def populate_sqlite_tariffs(file_name=TARIFF_CSV_PATH, db_path=TARIFF_DB_PATH):
+    """Write the parsed schedule to the tariff_lines table of db_path.
+
+    Every TariffIndex column is stored under its own name, plus normalized_code
+    (digits only) and chapter, which are indexed for lookups. The table is
+    rewritten in one transaction and tagged with the CSV's hash in tariff_meta.
+    """
+    index = get_tariff_index(file_name)
+    data = index.data
+    columns = list(data.columns)
+    column_sql = ", ".join(f'"{column}" {_sqlite_type(data[column].dtype)}' for column in columns)
+    placeholders = ", ".join("?" for _ in range(len(columns) + 3))
+
+    # Heading lines without a code get NULL so they never match a lookup.
+    normalized = [normalize_hts_code(code) or None for code in data["HTS Number"]]
+    values = [data[column].astype(object).tolist() if isinstance(data[column].dtype, pd.CategoricalDtype)
+              else data[column].to_numpy().tolist() for column in columns]
+    rows = zip(range(len(data)), normalized, [code and code[:2] for code in normalized], *values)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            conn.execute("DROP TABLE IF EXISTS tariff_lines")
+            conn.execute(f"CREATE TABLE tariff_lines (position INTEGER PRIMARY KEY, normalized_code TEXT, chapter TEXT, {column_sql})")
+            conn.executemany(f"INSERT INTO tariff_lines VALUES ({placeholders})", rows)
+            conn.execute("CREATE INDEX idx_tariff_lines_normalized_code ON tariff_lines (normalized_code)")
+            conn.execute("CREATE INDEX idx_tariff_lines_chapter ON tariff_lines (chapter)")
+            conn.execute("CREATE TABLE IF NOT EXISTS tariff_meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute("INSERT OR REPLACE INTO tariff_meta VALUES ('source_digest', ?)", (index.digest,))
+    finally:
+        conn.close()
+
+
+def ensure_sqlite_tariffs(file_name=TARIFF_CSV_PATH, db_path=TARIFF_DB_PATH):
+    """Populate tariff_lines unless it already holds this revision of the CSV.
+
+    Like get_tariff_index, only a stat is paid per call while the CSV is unchanged.
+    """
+    stamp = _file_stamp(file_name)
+    if _sqlite_stamps.get((file_name, db_path)) == stamp:
+        return
+    with _sqlite_lock:
+        if _sqlite_stamps.get((file_name, db_path)) == stamp:
+            return
+        try:
+            row = read_connection(db_path).execute(
+                "SELECT value FROM tariff_meta WHERE key = 'source_digest'").fetchone()
+        except sqlite3.OperationalError:
+            row = None
+        if row is None or row[0] != _file_digest(file_name):
+            populate_sqlite_tariffs(file_name, db_path)
+        _sqlite_stamps[(file_name, db_path)] = stamp
+
+
+def query_sqlite(hts_code, file_name=TARIFF_CSV_PATH, db_path=TARIFF_DB_PATH):
+    """Look an HTS code (dots optional) up in tariff_lines; same result shape as TariffIndex.lookup."""
+    ensure_sqlite_tariffs(file_name, db_path)
+    cursor = read_connection(db_path).execute(
+        "SELECT * FROM tariff_lines WHERE normalized_code = ? ORDER BY position LIMIT 1",
+        (normalize_hts_code(hts_code),))
+    # Skip position, normalized_code and chapter; the rest mirrors TariffIndex.data.
+    columns = [description[0] for description in cursor.description[3:]]
+    return pd.DataFrame([row[3:] for row in cursor.fetchall()], columns=columns)
+
+
 def query_database(hts_code):
     """Query the database to retrieve tariff data for the given HTS code."""
-    file_name = "data/htsdata.csv"
+    file_name = TARIFF_CSV_PATH
     try:
-        tariff_data = pd.read_csv(file_name)
-        tariff_data['General Rate of Duty'] = tariff_data['General Rate of Duty'].apply(parse_duty_rate)
-        return tariff_data[tariff_data['HTS Number'] == hts_code]
+        if LOOKUP_BACKEND == "sqlite":
+            return query_sqlite(hts_code, file_name)
+        return get_tariff_index(file_name).lookup(hts_code)
     except FileNotFoundError:
         print(f"Error: '{file_name}' not found.")
         return pd.DataFrame()
@@ -14,6 +348,38 @@ def query_database(hts_code):
         print(f"Error querying database: {e}")
         return pd.DataFrame()
 
+def complete_hts_code(prefix, limit=COMPLETION_LIMIT):
+    """Return up to `limit` (HTS Number, description) pairs for codes starting with prefix."""
+    try:
+        return get_tariff_index().complete(prefix, limit)
+    except Exception as e:
+        print(f"Error querying database: {e}")
+        return []
+
+def special_programs():
+    """Return the preferential program codes listed anywhere in the Special Rate of Duty column."""
+    try:
+        return list(get_tariff_index().programs.programs)
+    except Exception as e:
+        print(f"Error querying database: {e}")
+        return []
+
+def origin_countries():
+    """Return the origin country codes with a precomputed rate rule."""
+    try:
+        return get_tariff_index().origins.countries()
+    except Exception as e:
+        print(f"Error querying database: {e}")
+        return []
+
+def query_ancestors(hts_code):
+    """Return the description path (top-level heading first) for the given HTS code."""
+    try:
+        return get_tariff_index().ancestors(hts_code)
+    except Exception as e:
+        print(f"Error querying database: {e}")
+        return pd.DataFrame()
+
 def parse_duty_rate(rate):
     """Parse the duty rate from the CSV."""
     if isinstance(rate, str):
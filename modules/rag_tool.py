@@ -1,37 +1,179 @@
 import os
 import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import OpenAIEmbeddings
 import json
+from modules.answer_cache import AnswerCache
+from modules.document_search import ensure_documents_index, search_documents
+from modules.embeddings import VECTOR_STORE_PATH, CachedEmbeddings, get_embeddings, load_embedding_backend
 
-VECTOR_STORE_PATH = os.path.join(os.path.dirname(__file__), "data/vectorstore")
 DB_PATH = os.path.join(os.path.dirname(__file__), "hts_data.db")
 MEMORY_FILE = "rag_memory.json"
+# Passages returned by hybrid_search, and fetched from each retriever before fusion.
+HYBRID_K = 5
+HYBRID_CANDIDATES = 20
+# Reciprocal rank fusion constant; 60 is the value from the original RRF paper.
+RRF_K = 60
+# Files written by FAISS.save_local; a change to either reloads the store.
+VECTOR_STORE_FILES = ("index.faiss", "index.pkl")
+
+_vector_lock = threading.Lock()
+_vector_store = None
+_answer_cache = AnswerCache()
+# Threads for the vector half of hybrid_search. They are started on demand, so the
+# cap only needs to exceed the number of queries answered at once.
+SEARCH_WORKERS = 32
+_search_pool = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="rag-search")
+
+def _vector_store_stamp():
+    """Modification time and size of the saved index files, or None when no store is saved."""
+    stamp = []
+    for name in VECTOR_STORE_FILES:
+        try:
+            stat = os.stat(os.path.join(VECTOR_STORE_PATH, name))
+        except FileNotFoundError:
+            return None
+        stamp.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(stamp)
+
+def get_vector_store():
+    """Return the process-wide FAISS store, reloading it when its index files change.
+
+    Only a stat of the index files is paid per call while they are unchanged.
+    Returns None when no store has been saved.
+    """
+    global _vector_store
+    stamp = _vector_store_stamp()
+    cached = _vector_store
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    with _vector_lock:
+        cached = _vector_store
+        if cached is None or cached[0] != stamp:
+            store = None
+            if stamp is not None:
+                # Queries must be embedded by the backend the index was built with.
+                embeddings = get_embeddings(load_embedding_backend(VECTOR_STORE_PATH))
+                store = FAISS.load_local(VECTOR_STORE_PATH, embeddings)
+            cached = _vector_store = (stamp, store)
+    return cached[1]
 
 def initialize_rag_tool():
     """Initialize the RAG tool by loading vector store or fallback database."""
-    pass
+    try:
+        get_vector_store()
+    except Exception as e:
+        print(f"Error loading vector store: {e}")
+    try:
+        ensure_documents_index(DB_PATH)
+    except sqlite3.Error as e:
+        print(f"Error preparing full-text index: {e}")
+
+def _corpus_version():
+    """Change marker for everything answers are drawn from: the documents database and the vector store.
+
+    The -wal file is included because commits in WAL mode land there before the
+    database file itself changes. An empty -wal file counts as missing: readers
+    create one when they attach, which does not change the corpus.
+    """
+    stamps = []
+    for path in (DB_PATH, DB_PATH + "-wal"):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            stamps.append(None)
+            continue
+        stamps.append((stat.st_mtime_ns, stat.st_size) if stat.st_size else None)
+    return tuple(stamps), _vector_store_stamp()
 
 def handle_rag_query(query):
-    """Handle user query using LangChain or fallback to SQLite."""
+    """Answer a user query with the best passage from hybrid_search.
+
+    Answers are cached by normalized query (see modules.answer_cache) until they
+    expire or the corpus changes; errors are not cached.
+    """
+    version = _corpus_version()
+    answer = _answer_cache.get(query, version)
+    if answer is not None:
+        return answer
     try:
-        # LangChain Search
-        if os.path.exists(VECTOR_STORE_PATH):
-            vector_store = FAISS.load_local(VECTOR_STORE_PATH, OpenAIEmbeddings())
-            results = vector_store.similarity_search(query, k=1)
-            if results:
-                return results[0].page_content
-
-        # Fallback to SQLite
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("SELECT content FROM documents WHERE content LIKE ?", (f"%{query}%",))
-        result = cursor.fetchone()
-        conn.close()
-
-        return result[0] if result else "No relevant information found."
+        answer = _search_answer(query)
     except Exception as e:
         return f"Error while searching: {e}"
+    # The search itself may prepare the corpus (e.g. build the FTS index); only
+    # cache answers drawn from the version the lookup was made against.
+    if _corpus_version() == version:
+        _answer_cache.put(query, answer, version)
+    return answer
+
+def _search_answer(query):
+    results = hybrid_search(query, k=1)
+    return results[0][0] if results else "No relevant information found."
+
+def _lexical_search(query, k):
+    return [content for content, _ in search_documents(query, k=k, db_path=DB_PATH)]
+
+def _vector_search(query, k):
+    vector_store = get_vector_store()
+    if vector_store is None:
+        return []
+    results = vector_store.similarity_search(query, k=k)
+    return [document.page_content for document in results]
+
+def reciprocal_rank_fusion(rankings, rrf_k=RRF_K):
+    """Merge ranked lists of passages into [(passage, score)], best first.
+
+    A passage scores sum(1 / (rrf_k + rank)) over the lists it appears in (rank
+    starts at 1), so agreement between retrievers outranks a single high rank
+    and the lists' own score scales never need to be compared.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, passage in enumerate(ranking, start=1):
+            scores[passage] = scores.get(passage, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+def hybrid_search(query, k=HYBRID_K):
+    """Return the top k (passage, score) pairs from BM25 and vector search combined.
+
+    The vector search runs on _search_pool while BM25 runs on the calling thread
+    (reusing its cached SQLite connection), each returning HYBRID_CANDIDATES
+    passages, and the lists are merged by reciprocal_rank_fusion, so latency is
+    that of the slower one rather than their sum. A retriever that fails is
+    reported and left out of the fusion; if both fail, the error is raised.
+    """
+    depth = max(k, HYBRID_CANDIDATES)
+    vector = _search_pool.submit(_vector_search, query, depth)
+    rankings = []
+    error = None
+    try:
+        rankings.append(_lexical_search(query, depth))
+    except Exception as e:
+        print(f"Error in full-text search: {e}")
+        error = e
+    try:
+        rankings.append(vector.result())
+    except Exception as e:
+        print(f"Error in vector search: {e}")
+        error = e
+    if not rankings:
+        raise error
+    return reciprocal_rank_fusion(rankings)[:k]
+
+def answer_cache_stats():
+    """Hits, misses, hit rate and size of the handle_rag_query answer cache."""
+    return _answer_cache.stats()
+
+def embedding_cache_stats():
+    """Hits, misses and hit rate of the embedding cache used for queries; empty if none is in use."""
+    cached = _vector_store
+    embeddings = getattr(cached[1], "embeddings", None) if cached else None
+    return embeddings.stats() if isinstance(embeddings, CachedEmbeddings) else {}
+
+def clear_answer_cache():
+    """Drop all cached answers, e.g. right after re-ingesting documents in this process."""
+    _answer_cache.clear()
 
 def save_to_memory(memory, file_name):
     """Save memory to a JSON file."""
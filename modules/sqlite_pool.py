@@ -0,0 +1,56 @@
+import os
+import sqlite3
+import threading
+from urllib.parse import quote
+
+# Tuned for many concurrent readers of a database that is rarely written.
+READ_PRAGMAS = {
+    "query_only": "ON",
+    # Map up to 256 MiB of the file so pages are read straight from the OS page cache.
+    "mmap_size": 256 * 1024 * 1024,
+    # Negative values are KiB: 64 MiB of page cache per connection.
+    "cache_size": -64 * 1024,
+    "temp_store": "MEMORY",
+}
+
+_local = threading.local()
+
+
+def _read_only_uri(db_path):
+    """file: URI opening db_path read-only; "?", "#" and "%" in the path are percent-encoded.
+
+    Windows paths become file:///C:/... (and UNC shares file:////server/share/...),
+    the forms SQLite documents for drive letters.
+    """
+    path = os.path.abspath(db_path).replace(os.sep, "/")
+    if not path.startswith("/"):
+        path = "/" + path
+    return f"file://{quote(path, safe='/:')}?mode=ro"
+
+
+def read_connection(db_path):
+    """Return this thread's read-only connection to db_path, opening it on first use.
+
+    Connections are opened in read-only URI mode with READ_PRAGMAS and cached per
+    thread, so concurrent Streamlit sessions each keep one connection instead of
+    connecting on every query. sqlite3 also caches compiled statements per
+    connection, so repeated SQL runs as a prepared statement. Raises
+    sqlite3.OperationalError if db_path does not exist.
+    """
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(db_path)
+    if conn is None:
+        conn = sqlite3.connect(_read_only_uri(db_path), uri=True)
+        for name, value in READ_PRAGMAS.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        connections[db_path] = conn
+    return conn
+
+
+def close_read_connections():
+    """Close this thread's cached connections, e.g. before the database file is replaced."""
+    for conn in getattr(_local, "connections", {}).values():
+        conn.close()
+    _local.connections = {}
@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+
+from modules.prepare_db import TARIFF_CSV_PATH, TariffIndex, _file_digest, load_tariff_data
+
+# Columns compared to tell whether a line changed between editions.
+DIFF_COLUMNS = [
+    "Indent", "Description", "Unit of Quantity",
+    "General Rate of Duty", "Special Rate of Duty", "Column 2 Rate of Duty",
+    "Quota Quantity", "Additional Duties", "Rate Source",
+]
+
+
+class TariffEditions:
+    """Several editions of the HTS schedule held in memory at once.
+
+    Lines are stored once in a row store shared by all editions. A line is keyed
+    by the hash of its whole content, so a line that is unchanged from the last
+    edition is not stored again. Text and categorical columns hold int32 codes
+    into one string pool, so a description, unit or program list is kept once
+    whatever the number of lines or editions that repeat it. An edition is an
+    array of row ids in schedule order. Adding an edition therefore costs 4 bytes
+    per line plus the lines that differ from earlier editions.
+    """
+
+    def __init__(self):
+        self.columns = None
+        self.dtypes = {}
+        self.strings = []
+        self.string_ids = {}
+        self._string_array = None
+        self.store = {}
+        self.row_ids = {}
+        self.editions = {}
+
+    def add(self, label, file_name=TARIFF_CSV_PATH):
+        """Load an edition from a schedule CSV under label; returns the number of newly stored lines."""
+        data = load_tariff_data(file_name, _file_digest(file_name))
+        if self.columns is None:
+            self.columns = list(data.columns)
+            self.dtypes = {column: data[column].dtype for column in self.columns}
+            self.store = {column: self._empty_column(column) for column in self.columns}
+        elif list(data.columns) != self.columns:
+            raise ValueError(f"'{file_name}' does not have the columns of the editions already loaded.")
+
+        hashes = pd.util.hash_pandas_object(data, index=False).to_numpy()
+        rows = np.fromiter((self.row_ids.get(value, -1) for value in hashes.tolist()), dtype=np.int32,
+                           count=len(hashes))
+        # Lines new to the store: not seen before, and the first of any repeats within this edition.
+        missing = np.flatnonzero(rows < 0)
+        _, first = np.unique(hashes[missing], return_index=True)
+        new_positions = missing[np.sort(first)]
+        start = len(self.row_ids)
+        for offset, position in enumerate(new_positions.tolist()):
+            self.row_ids[hashes[position].item()] = start + offset
+        new_lines = data.iloc[new_positions]
+        for column in self.columns:
+            self.store[column] = np.concatenate([self.store[column], self._encode(new_lines[column])])
+
+        rows[missing] = [self.row_ids[value] for value in hashes[missing].tolist()]
+        self.editions[label] = rows
+        return len(new_positions)
+
+    def _empty_column(self, column):
+        if self._is_text(column):
+            return np.empty(0, dtype=np.int32)
+        return np.empty(0, dtype=self.dtypes[column])
+
+    def _is_text(self, column):
+        dtype = self.dtypes[column]
+        return not (pd.api.types.is_numeric_dtype(dtype) or pd.api.types.is_bool_dtype(dtype)) \
+            or isinstance(dtype, pd.CategoricalDtype)
+
+    def _encode(self, values):
+        """Column values as store entries: string pool ids for text, the values themselves otherwise."""
+        if not self._is_text(values.name):
+            return values.to_numpy()
+        codes, uniques = pd.factorize(values.astype(object).fillna("").to_numpy(dtype=object))
+        ids = np.array([self._intern(text) for text in uniques.tolist()], dtype=np.int32)
+        return ids[codes] if len(ids) else np.empty(len(values), dtype=np.int32)
+
+    def _intern(self, text):
+        string_id = self.string_ids.get(text)
+        if string_id is None:
+            string_id = self.string_ids[text] = len(self.strings)
+            self.strings.append(text)
+            self._string_array = None
+        return string_id
+
+    def _decode(self, column, rows):
+        values = self.store[column][rows]
+        if not self._is_text(column):
+            return values
+        if self._string_array is None:
+            self._string_array = np.array(self.strings, dtype=object)
+        texts = self._string_array[values]
+        if isinstance(self.dtypes[column], pd.CategoricalDtype):
+            return pd.Categorical(texts)
+        return pd.Series(texts, dtype=str)
+
+    def labels(self):
+        """Edition labels in the order they were added."""
+        return list(self.editions)
+
+    def frame(self, label, columns=None):
+        """Rebuild an edition (or some of its columns) as a DataFrame shaped like load_tariff_data's."""
+        rows = self.editions[label]
+        return pd.DataFrame({column: self._decode(column, rows) for column in columns or self.columns})
+
+    def index(self, label):
+        """Build a TariffIndex over an edition, e.g. to price entries against last year's rates."""
+        return TariffIndex(label, None, label, self.frame(label))
+
+    def lookup(self, label, hts_code):
+        """Return the edition's row for an HTS code as a one-row DataFrame (empty if unknown)."""
+        rows = self.editions[label]
+        string_id = self.string_ids.get(hts_code.strip(), -1)
+        matches = np.flatnonzero(self.store["HTS Number"][rows] == string_id)[:1]
+        return pd.DataFrame({column: self._decode(column, rows[matches]) for column in self.columns})
+
+    def diff(self, old_label, new_label):
+        """Coded lines added, removed or changed from old_label to new_label.
+
+        Lines are matched by HTS Number; a line counts as changed when any of
+        DIFF_COLUMNS differs. Unchanged lines share a row id, so they are skipped
+        without decoding. Returns HTS Number, Change ("added", "removed",
+        "changed") and, for changed lines, the names of the columns that differ.
+        """
+        codes = self.store["HTS Number"]
+        empty = self.string_ids.get("", -1)
+        old_rows, new_rows = self.editions[old_label], self.editions[new_label]
+        old = pd.Series(old_rows, index=codes[old_rows])
+        new = pd.Series(new_rows, index=codes[new_rows])
+        old = old[(old.index != empty) & ~old.index.duplicated()]
+        new = new[(new.index != empty) & ~new.index.duplicated()]
+
+        paired = pd.concat([old.rename("old"), new.rename("new")], axis=1, join="outer")
+        paired = paired[paired["old"] != paired["new"]]
+        changes = []
+        for code, old_row, new_row in paired.itertuples():
+            if pd.isna(old_row):
+                changes.append((code, "added", ""))
+            elif pd.isna(new_row):
+                changes.append((code, "removed", ""))
+            else:
+                columns = [column for column in DIFF_COLUMNS if column in self.store
+                           and self.store[column][int(old_row)] != self.store[column][int(new_row)]]
+                if columns:
+                    changes.append((code, "changed", ", ".join(columns)))
+        result = pd.DataFrame(changes, columns=["HTS Number", "Change", "Columns"])
+        result["HTS Number"] = [self.strings[code] for code in result["HTS Number"].tolist()]
+        return result
+
+    def memory_usage(self):
+        """Approximate bytes held: the row store, edition row ids and the pooled strings."""
+        arrays = sum(values.nbytes for values in self.store.values())
+        arrays += sum(rows.nbytes for rows in self.editions.values())
+        return arrays + sum(len(text.encode("utf-8")) + 49 for text in self.strings)
+
+
+def load_editions(editions):
+    """Load {label: csv path} into one TariffEditions, e.g. {"2024": "data/hts_2024.csv", "2025": ...}."""
+    store = TariffEditions()
+    for label, file_name in editions.items():
+        added = store.add(label, file_name)
+        print(f"Edition '{label}': {len(store.editions[label])} lines, {added} new.")
+    return store
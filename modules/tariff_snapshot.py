@@ -0,0 +1,148 @@
+import glob
+import json
+import mmap
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# Bump when the parsed columns change so stale snapshots are not reused.
+SNAPSHOT_VERSION = 3
+SNAPSHOT_DIR_NAME = ".snapshots"
+SNAPSHOT_MAGIC = b"HTSSNAP\0"
+# Arrays start on cache-line boundaries so every dtype can be viewed in place.
+SNAPSHOT_ALIGNMENT = 64
+
+
+def snapshot_path(file_name, digest):
+    """Snapshot location for a CSV with the given content hash, e.g. data/.snapshots/htsdata-v3-1a2b....snap."""
+    directory = os.path.join(os.path.dirname(file_name) or ".", SNAPSHOT_DIR_NAME)
+    stem = os.path.splitext(os.path.basename(file_name))[0]
+    return os.path.join(directory, f"{stem}-v{SNAPSHOT_VERSION}-{digest[:16]}.snap")
+
+
+def pack_strings(values):
+    """Encode strings as one NUL-terminated UTF-8 byte buffer plus int64 start offsets.
+
+    String i occupies buffer[offsets[i]:offsets[i + 1] - 1]; there are n + 1 offsets.
+    """
+    encoded = [str(value).encode("utf-8") + b"\0" for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def unpack_strings(buffer, offsets):
+    """Inverse of pack_strings; returns a list of str."""
+    if len(offsets) <= 1:
+        return []
+    # One decode and a C-level split beat slicing and decoding every string.
+    return bytes(buffer).decode("utf-8").split("\0")[:-1]
+
+
+def _aligned(offset):
+    return -(-offset // SNAPSHOT_ALIGNMENT) * SNAPSHOT_ALIGNMENT
+
+
+def save_frame_snapshot(frame, path):
+    """Write a DataFrame as a flat, memory-mappable snapshot file, atomically.
+
+    The file is SNAPSHOT_MAGIC, the little-endian uint64 length of a JSON header,
+    the header, then every array's raw bytes at an aligned offset. Numeric columns
+    are stored as-is; text and categorical columns as integer codes plus their
+    distinct values packed as UTF-8. Loading needs no parsing and no pickle.
+    """
+    columns = []
+    arrays = []
+    end = 0
+    for column in frame.columns:
+        values = frame[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            kind = "category"
+            parts = {"codes": values.cat.codes.to_numpy()}
+            parts["buffer"], parts["offsets"] = pack_strings(values.cat.categories)
+        elif pd.api.types.is_numeric_dtype(values.dtype) or pd.api.types.is_bool_dtype(values.dtype):
+            kind = "numeric"
+            parts = {"values": values.to_numpy()}
+        else:
+            # Dictionary-encoded: a row is a code into the column's distinct strings.
+            kind = "text"
+            codes, uniques = pd.factorize(values.fillna("").to_numpy(dtype=object))
+            parts = {"codes": codes.astype(np.int32)}
+            parts["buffer"], parts["offsets"] = pack_strings(uniques)
+        specs = {}
+        for role, array in parts.items():
+            offset = _aligned(end)
+            specs[role] = {"dtype": array.dtype.str, "count": len(array), "offset": offset}
+            arrays.append((offset, array))
+            end = offset + array.nbytes
+        columns.append({"name": column, "kind": kind, "arrays": specs})
+    header = json.dumps({"columns": columns}).encode("utf-8")
+
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    handle, temp_path = tempfile.mkstemp(dir=directory, suffix=".snap.tmp")
+    try:
+        with os.fdopen(handle, "wb") as file:
+            file.write(SNAPSHOT_MAGIC + len(header).to_bytes(8, "little") + header)
+            data_start = _aligned(file.tell())
+            for offset, array in arrays:
+                file.write(b"\0" * (data_start + offset - file.tell()))
+                file.write(np.ascontiguousarray(array).tobytes())
+        # mkstemp creates owner-only files; other worker accounts need to read snapshots too.
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def load_frame_snapshot(path):
+    """Map a snapshot written by save_frame_snapshot and return it as a DataFrame.
+
+    The file is mapped read-only, and numeric columns and categorical codes are
+    read-only NumPy views of the mapping rather than copies. Every process that
+    loads the same snapshot therefore shares those pages through the OS page
+    cache instead of holding its own copy. Text is decoded once per distinct
+    string, and rows repeating a string share one str object.
+    """
+    with open(path, "rb") as file:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    if mapped[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+        raise ValueError(f"'{path}' is not a tariff snapshot.")
+    header_start = len(SNAPSHOT_MAGIC) + 8
+    header_length = int.from_bytes(mapped[len(SNAPSHOT_MAGIC):header_start], "little")
+    header = json.loads(mapped[header_start:header_start + header_length])
+    data_start = _aligned(header_start + header_length)
+
+    def view(spec):
+        if not spec["count"]:
+            return np.empty(0, dtype=spec["dtype"])
+        return np.frombuffer(mapped, dtype=spec["dtype"], count=spec["count"], offset=data_start + spec["offset"])
+
+    columns = {}
+    for column in header["columns"]:
+        arrays = {role: view(spec) for role, spec in column["arrays"].items()}
+        if column["kind"] == "category":
+            categories = unpack_strings(arrays["buffer"], arrays["offsets"])
+            columns[column["name"]] = pd.Categorical.from_codes(arrays["codes"], categories=categories)
+        elif column["kind"] == "numeric":
+            columns[column["name"]] = arrays["values"]
+        else:
+            uniques = np.array(unpack_strings(arrays["buffer"], arrays["offsets"]), dtype=object)
+            columns[column["name"]] = pd.Series(uniques[arrays["codes"]], dtype=str)
+    # copy=False keeps the mapped arrays as they are instead of consolidating them into new blocks.
+    return pd.DataFrame(columns, copy=False)
+
+
+def remove_stale_snapshots(file_name, keep_path):
+    """Delete other snapshots of the same CSV, e.g. after the schedule was updated."""
+    stem = os.path.splitext(os.path.basename(file_name))[0]
+    pattern = os.path.join(os.path.dirname(keep_path), f"{stem}-v*-*.*")
+    for path in glob.glob(pattern):
+        if os.path.abspath(path) != os.path.abspath(keep_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,146 @@
+import argparse
+import datetime
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from modules.prepare_db import (TARIFF_DB_PATH, TariffIndex, _file_digest, _file_stamp, load_tariff_data,
+                                normalize_hts_code)
+from modules.sqlite_pool import read_connection
+
+# Published texts and effective typed rates kept for every version of a line.
+VERSIONED_COLUMNS = [
+    "HTS Number", "Indent", "Description", "Unit of Quantity",
+    "General Rate of Duty", "Special Rate of Duty", "Column 2 Rate of Duty",
+    "General Ad Valorem", "General Specific", "General Specific Unit",
+    "Column 2 Ad Valorem", "Column 2 Specific", "Column 2 Specific Unit",
+    "Rate Source",
+]
+
+
+def _iso_date(value):
+    """'2025-01-01', a date or a datetime -> '2025-01-01'."""
+    return pd.Timestamp(value).date().isoformat()
+
+
+def _create_tables(conn):
+    column_sql = ", ".join(f'"{column}"' for column in VERSIONED_COLUMNS)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS tariff_revisions (
+            revision TEXT PRIMARY KEY,
+            effective_from TEXT NOT NULL,
+            source_digest TEXT NOT NULL,
+            ingested_at TEXT NOT NULL
+        )
+    """)
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS tariff_history (
+            normalized_code TEXT NOT NULL,
+            row_hash INTEGER NOT NULL,
+            effective_from TEXT NOT NULL,
+            effective_to TEXT,
+            {column_sql}
+        )
+    """)
+    # Interval index: the latest version starting on or before a date is one seek away.
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_tariff_history_interval
+        ON tariff_history (normalized_code, effective_from)
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tariff_history_open ON tariff_history (effective_to)")
+
+
+def _revision_lines(csv_file_path, digest):
+    """Coded lines of one schedule revision with effective rates, keyed and hashed."""
+    index = TariffIndex(csv_file_path, _file_stamp(csv_file_path), digest, load_tariff_data(csv_file_path, digest))
+    lines = index.data.iloc[sorted(index.positions.values())][VERSIONED_COLUMNS].astype(object)
+    lines.insert(0, "normalized_code", [normalize_hts_code(code) for code in lines["HTS Number"]])
+    lines.insert(1, "row_hash", pd.util.hash_pandas_object(lines[VERSIONED_COLUMNS], index=False)
+                 .to_numpy().view(np.int64))
+    return lines.drop_duplicates("normalized_code")
+
+
+def ingest_revision(csv_file_path, effective_from, revision=None, db_path=TARIFF_DB_PATH):
+    """Add a schedule revision to the versioned store as a delta against the open versions.
+
+    Only the currently open (effective_to IS NULL) code/hash pairs are read back.
+    Lines whose hash is unchanged keep their open interval; changed and removed
+    lines are closed at effective_from, and changed and new lines get a new
+    interval starting there. Revisions must be ingested in effective-date order.
+    Returns (added, closed) version counts.
+    """
+    effective_from = _iso_date(effective_from)
+    digest = _file_digest(csv_file_path)
+    revision = revision or effective_from
+    lines = _revision_lines(csv_file_path, digest)
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            _create_tables(conn)
+            latest = conn.execute("SELECT max(effective_from) FROM tariff_revisions").fetchone()[0]
+            if latest is not None and effective_from <= latest:
+                raise ValueError(f"Revision effective {effective_from} is not after the latest one ({latest}).")
+
+            open_versions = pd.read_sql_query(
+                "SELECT rowid, normalized_code, row_hash FROM tariff_history WHERE effective_to IS NULL", conn)
+            merged = open_versions.merge(lines[["normalized_code", "row_hash"]], on="normalized_code",
+                                         how="outer", suffixes=("_open", ""), indicator=True)
+            unchanged = (merged["_merge"] == "both") & (merged["row_hash_open"] == merged["row_hash"])
+            to_close = merged.loc[(merged["_merge"] != "right_only") & ~unchanged, "rowid"].astype(np.int64)
+            to_add = set(merged.loc[(merged["_merge"] != "left_only") & ~unchanged, "normalized_code"])
+
+            conn.executemany("UPDATE tariff_history SET effective_to = ? WHERE rowid = ?",
+                             ((effective_from, rowid) for rowid in to_close.tolist()))
+            added = lines[lines["normalized_code"].isin(to_add)]
+            placeholders = ", ".join("?" for _ in range(len(VERSIONED_COLUMNS) + 4))
+            conn.executemany(
+                f"INSERT INTO tariff_history VALUES ({placeholders})",
+                ((row[0], row[1], effective_from, None, *row[2:]) for row in added.itertuples(index=False)),
+            )
+            conn.execute("INSERT INTO tariff_revisions VALUES (?, ?, ?, ?)",
+                         (revision, effective_from, digest, datetime.datetime.now().isoformat(timespec="seconds")))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+    print(f"Revision '{revision}' effective {effective_from}: {len(added)} versions added, {len(to_close)} closed.")
+    return len(added), len(to_close)
+
+
+def query_tariff_on(hts_code, entry_date, db_path=TARIFF_DB_PATH):
+    """Return the tariff line in force for hts_code on entry_date, as a one-row DataFrame (empty if none)."""
+    entry_date = _iso_date(entry_date)
+    cursor = read_connection(db_path).execute(
+        """
+        SELECT * FROM tariff_history
+        WHERE normalized_code = ? AND effective_from <= ?
+        ORDER BY effective_from DESC LIMIT 1
+        """,
+        (normalize_hts_code(hts_code), entry_date),
+    )
+    row = cursor.fetchone()
+    columns = [description[0] for description in cursor.description]
+    data = pd.DataFrame([row] if row else [], columns=columns)
+    # The latest version starting by entry_date may have been closed (line removed) before it.
+    data = data[data["effective_to"].isna() | (data["effective_to"] > entry_date)]
+    return data.drop(columns=["normalized_code", "row_hash"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add an HTS schedule revision to the versioned tariff store.")
+    parser.add_argument("csv", help="Schedule CSV in the data/htsdata.csv layout.")
+    parser.add_argument("effective_from", help="Date the revision takes effect (YYYY-MM-DD).")
+    parser.add_argument("--revision", help="Revision label (defaults to the effective date).")
+    parser.add_argument("--db", default=TARIFF_DB_PATH, help="SQLite database holding the store.")
+    args = parser.parse_args()
+    ingest_revision(args.csv, args.effective_from, args.revision, args.db)
+
+
+if __name__ == "__main__":
+    main()